@@ -7,11 +7,28 @@ smoke/fire detection, pose estimation
 import cv2
 import numpy as np
 import time
-from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 from loguru import logger
 
 
+# Second-resolution ISO prefix, re-formatted only when the wall-clock second changes
+_ts_cache = [-1, ""]
+
+
+def _utc_timestamp() -> str:
+    """Return the current UTC time as an ISO-8601 string with microseconds."""
+    now = time.time()
+    sec = int(now)
+    if sec != _ts_cache[0]:
+        _ts_cache[0] = sec
+        _ts_cache[1] = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec))
+    return f"{_ts_cache[1]}.{int((now - sec) * 1e6):06d}"
+
+
+# Gesture name indexed by extended-finger count (0-5)
+_FINGER_NAMES = ("fist", "pointing", "peace", "three", "four", "open_palm")
+
+
 class GestureRecognitionService:
     """Feature 6: Hand gesture detection and classification."""
 
@@ -66,15 +83,14 @@ class GestureRecognitionService:
             "gestures": gestures,
             "count": len(gestures),
             "inference_ms": round((time.time() - start) * 1000, 2),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _utc_timestamp()
         }
         if gestures:
             self.gesture_history.append(result)
         return result
 
     def _classify_finger_count(self, fingers: int) -> str:
-        mapping = {0: "fist", 1: "pointing", 2: "peace", 3: "three", 4: "four", 5: "open_palm"}
-        return mapping.get(fingers, "unknown")
+        return _FINGER_NAMES[fingers] if 0 <= fingers <= 5 else "unknown"
 
     def register_gesture_command(self, gesture: str, command: str):
         self.gesture_callbacks[gesture] = command
@@ -126,7 +142,7 @@ class EmotionDetectionService:
             "count": len(faces),
             "dominant_emotion": faces[0]["emotion"] if faces else None,
             "inference_ms": round((time.time() - start) * 1000, 2),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _utc_timestamp()
         }
         self.emotion_history.append(result)
         return result
@@ -217,7 +233,7 @@ class SceneClassificationService:
                 "color_diversity": round(color_diversity, 4)
             },
             "inference_ms": round((time.time() - start) * 1000, 2),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _utc_timestamp()
         }
         self.scene_history.append(result)
         return result
@@ -281,7 +297,7 @@ class OCRService:
             "has_text": len(text_regions) > 0,
             "image_size": [frame.shape[1], frame.shape[0]],
             "inference_ms": round((time.time() - start) * 1000, 2),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _utc_timestamp()
         }
         self.ocr_history.append(result)
         return result
@@ -331,7 +347,7 @@ class ColorAnalysisService:
             "palette_type": self._classify_palette(colors),
             "warmth": self._compute_warmth(colors),
             "inference_ms": round((time.time() - start) * 1000, 2),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _utc_timestamp()
         }
         self.color_history.append(result)
         return result
@@ -389,7 +405,7 @@ class ImageQualityService:
             "resolution": [frame.shape[1], frame.shape[0]],
             "quality_grade": self._grade(overall),
             "inference_ms": round((time.time() - start) * 1000, 2),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _utc_timestamp()
         }
         self.quality_history.append(result)
         return result
@@ -477,7 +493,7 @@ class CrowdCountingService:
             "density_ratio": round(fg_ratio, 4),
             "keypoints": [{"x": int(kp.pt[0]), "y": int(kp.pt[1]), "size": round(kp.size, 1)} for kp in keypoints[:20]],
             "inference_ms": round((time.time() - start) * 1000, 2),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _utc_timestamp()
         }
         self.count_history.append(result)
         return result
@@ -522,7 +538,7 @@ class SafetyDetectionService:
             "smoke": {"detected": smoke_detected, "coverage": round(smoke_ratio * 100, 2), "severity": "high" if smoke_ratio > 0.4 else "medium" if smoke_ratio > 0.15 else "none"},
             "overall_risk": "critical" if (fire_detected and smoke_detected) else "high" if fire_detected else "medium" if smoke_detected else "low",
             "inference_ms": round((time.time() - start) * 1000, 2),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _utc_timestamp()
         }
         if fire_detected or smoke_detected:
             self.alert_history.append(result)
@@ -554,7 +570,7 @@ class SafetyDetectionService:
             "hardhat_coverage": round(hat_ratio * 100, 2),
             "ppe_compliant": hivis_ratio > 0.03 and hat_ratio > 0.05,
             "inference_ms": round((time.time() - start) * 1000, 2),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _utc_timestamp()
         }
 
 
@@ -607,7 +623,7 @@ class MotionAnalysisService:
             "regions": motion_regions[:20],
             "region_count": len(motion_regions),
             "inference_ms": round((time.time() - start) * 1000, 2),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _utc_timestamp()
         }
         self.motion_history.append(result)
         return result
@@ -644,7 +660,7 @@ class MotionAnalysisService:
             "dominant_direction": dominant_direction,
             "direction_distribution": directions,
             "has_significant_motion": avg_magnitude > 2.0,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _utc_timestamp()
         }
 
 
@@ -894,9 +894,13 @@ void mqttCallback(char* topic, byte* payload, unsigned int length) {
     
     String topicStr = String(topic);
     
-    // Parse JSON command
+    // Parse command (JSON, or a MessagePack map from Jarvis)
     StaticJsonDocument<512> doc;
-    DeserializationError error = deserializeJson(doc, message);
+    uint8_t first = length ? payload[0] : 0;
+    bool msgpack = (first & 0xF0) == 0x80 || first == 0xDE || first == 0xDF;
+    DeserializationError error = msgpack
+        ? deserializeMsgPack(doc, payload, length)
+        : deserializeJson(doc, message);
     if (error) return;
     
     const char* cmd = doc["command"];
@@ -6,7 +6,14 @@
 #include <ArduinoJson.h>
 #include "config.h"
 
-typedef void (*MQTTMessageCallback)(const char* topic, const char* payload);
+typedef void (*MQTTMessageCallback)(const char* topic, const char* payload, unsigned int length);
+
+// Jarvis may send command payloads as MessagePack maps instead of JSON
+inline bool isMsgPackPayload(const char* payload, unsigned int length) {
+    if (length == 0) return false;
+    uint8_t b = (uint8_t)payload[0];
+    return (b & 0xF0) == 0x80 || b == 0xDE || b == 0xDF;  // fixmap, map16, map32
+}
 
 class MQTTClientManager {
 private:
@@ -34,11 +41,11 @@ private:
             char message[length + 1];
             memcpy(message, payload, length);
             message[length] = '\0';
-            _instance->handleMessage(topic, message);
+            _instance->handleMessage(topic, message, length);
         }
     }
 
-    void handleMessage(const char* topic, const char* payload) {
+    void handleMessage(const char* topic, const char* payload, unsigned int length) {
         Serial.printf("[MQTT] Message on %s: %s\n", topic, payload);
         _messageCount++;
         _lastMessageTime = millis();
@@ -50,7 +57,7 @@ private:
         
         // Forward to user callback
         if (_userCallback) {
-            _userCallback(topic, payload);
+            _userCallback(topic, payload, length);
         }
     }
 
@@ -449,9 +449,11 @@ void broadcastSensorData() {
 // ============================================
 // MQTT Message Handler
 // ============================================
-void onMQTTMessage(const char* topic, const char* payload) {
+void onMQTTMessage(const char* topic, const char* payload, unsigned int length) {
     StaticJsonDocument<512> doc;
-    DeserializationError error = deserializeJson(doc, payload);
+    DeserializationError error = isMsgPackPayload(payload, length)
+        ? deserializeMsgPack(doc, payload, length)
+        : deserializeJson(doc, payload);
     if (error) return;
     
     String topicStr = String(topic);
@@ -655,6 +657,27 @@ void setupAPI() {
         request->send(200, "application/json", "{\"all_relays\":" + String(state) + "}");
     });
 
+    // states=relay:state pairs, e.g. "1:1,3:0,5:1", applied in one request
+    server.on((String(API_PREFIX) + "/gpio/relay/batch").c_str(), HTTP_POST, [](AsyncWebServerRequest* request) {
+        if (!authenticate(request)) return;
+        String states = "";
+        if (request->hasParam("states")) states = request->getParam("states")->value();
+        int applied = 0, start = 0;
+        while (start < (int)states.length()) {
+            int end = states.indexOf(',', start);
+            if (end < 0) end = states.length();
+            int colon = states.indexOf(':', start);
+            if (colon > start && colon < end) {
+                gpioMgr.setRelay(states.substring(start, colon).toInt(),
+                                 states.substring(colon + 1, end).toInt() == 1);
+                applied++;
+            }
+            start = end + 1;
+        }
+        gpioMgr.buzzPattern("relay");
+        request->send(200, "application/json", "{\"relays_set\":" + String(applied) + "}");
+    });
+
     server.on((String(API_PREFIX) + "/gpio/scene/save").c_str(), HTTP_POST, [](AsyncWebServerRequest* request) {
         if (!authenticate(request)) return;
         int sceneIdx = 0;
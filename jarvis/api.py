@@ -4,18 +4,29 @@ Jarvis AI - API Routes
 FastAPI REST + WebSocket endpoints for the Jarvis system.
 """
 import asyncio
+import itertools
 import os
 import json
-from datetime import datetime
-from typing import Optional, List
+import time
+from dataclasses import dataclass, field
+from typing import Annotated, Optional, List, Dict
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException, Query
+import cv2
+import numpy as np
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from loguru import logger
+from pydantic import BaseModel, ConfigDict, Field
 
-from jarvis.config import settings
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+from jarvis.config import settings, ensure_dirs
 from jarvis.services.jarvis_brain import jarvis_brain, JarvisState
 from jarvis.services.face_recognition_service import face_service
 from jarvis.services.voice_service import voice_service
@@ -36,6 +47,7 @@ mqtt_bridge = MQTTBridgeService(
     username=settings.MQTT_USERNAME,
     password=settings.MQTT_PASSWORD,
     client_id=settings.MQTT_CLIENT_ID,
+    msgpack_commands=settings.MQTT_MSGPACK_COMMANDS,
 )
 esp32_manager = ESP32ManagerService(mqtt_bridge=mqtt_bridge)
 
@@ -51,6 +63,7 @@ app = FastAPI(
     title="Jarvis AI",
     description="Intelligent Home AI Assistant with Face Recognition, Voice Control, and Security",
     version="1.0.0",
+    default_response_class=ORJSONResponse if ORJSON_AVAILABLE else JSONResponse,
 )
 
 app.add_middleware(
@@ -76,27 +89,133 @@ async def dashboard():
 # ================================================================
 # WebSocket Manager
 # ================================================================
+def _dumps(message: dict) -> bytes:
+    """Serialize a message to UTF-8 JSON for a binary WebSocket frame."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(message)
+    return json.dumps(message).encode()
+
+
+def _loads(data: str) -> dict:
+    """Parse an inbound JSON text frame."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+@dataclass
+class ConnState:
+    """Outbound state for one WebSocket client."""
+    pending: Dict = field(default_factory=dict)
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+    task: Optional[asyncio.Task] = None
+    # Snapshot this client last received ("init" or patched up to)
+    last_sent: Optional[dict] = None
+    # Newest snapshot to patch towards
+    snapshot: Optional[dict] = None
+
+
 class WSManager:
-    def __init__(self):
-        self.connections: List[WebSocket] = []
+    QUEUE_SIZE = 32
+    FLUSH_DELAY = 0.03  # seconds
+    # Message types where only the most recent unsent message matters
+    LATEST_WINS = frozenset({"state_change", "motion_event", "person_detected"})
+    # Pending-queue key of a client's "patch", built when it is sent
+    PATCH = "patch"
 
-    async def connect(self, ws: WebSocket):
+    def __init__(self):
+        self.connections: Dict[WebSocket, ConnState] = {}
+        self._seq = itertools.count()
+        self._outbox: Dict = {}
+        self._snapshot: Optional[dict] = None
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    async def connect(self, ws: WebSocket, snapshot: dict, init_payload: bytes):
+        """Accept ``ws`` and send it "init" before anything else.
+
+        The client is registered first, so messages flushed while init is
+        being sent wait in its queue, but its relay only starts afterwards.
+        """
         await ws.accept()
-        self.connections.append(ws)
+        # Patches for this client start from the snapshot it is sent
+        state = ConnState(last_sent=snapshot)
+        self.connections[ws] = state
+        await ws.send_bytes(init_payload)
+        state.task = asyncio.create_task(self._relay(ws, state))
 
     def disconnect(self, ws: WebSocket):
-        if ws in self.connections:
-            self.connections.remove(ws)
+        state = self.connections.pop(ws, None)
+        if state and state.task and state.task is not asyncio.current_task():
+            state.task.cancel()
+
+    async def _relay(self, ws: WebSocket, state: ConnState):
+        """Drain one client's pending messages so a slow socket only delays itself."""
+        try:
+            while True:
+                await state.wakeup.wait()
+                state.wakeup.clear()
+                batch = list(state.pending.values())
+                state.pending.clear()
+                for payload in batch:
+                    if payload is None:
+                        payload = self._patch_for(state)
+                        if payload is None:
+                            continue
+                    await ws.send_bytes(payload)
+        except Exception:
+            self.disconnect(ws)
+
+    @staticmethod
+    def _patch_for(state: ConnState) -> Optional[bytes]:
+        """Serialize the changes since this client's last snapshot, if any."""
+        patch = _diff_snapshot(state.last_sent, state.snapshot)
+        state.last_sent = state.snapshot
+        return _dumps({"type": "patch", "data": patch}) if patch else None
+
+    def sync_state(self, snapshot: dict):
+        """Send every client a "patch" from what it last received to ``snapshot``."""
+        self._snapshot = snapshot
+        self._schedule_flush()
 
     async def broadcast(self, message: dict):
-        dead = []
-        for ws in self.connections:
-            try:
-                await ws.send_json(message)
-            except Exception:
-                dead.append(ws)
-        for ws in dead:
-            self.disconnect(ws)
+        # Buffer for FLUSH_DELAY so bursts are coalesced before serializing.
+        # Latest-wins types replace any unsent message of the same type.
+        msg_type = message.get("type")
+        key = msg_type if msg_type in self.LATEST_WINS else next(self._seq)
+        self._outbox.pop(key, None)
+        self._outbox[key] = message
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self.FLUSH_DELAY, self._flush
+            )
+
+    def _flush(self):
+        """Serialize each buffered message once and hand it to every client."""
+        self._flush_handle = None
+        outbox, self._outbox = self._outbox, {}
+        for key, message in outbox.items():
+            payload = _dumps(message)
+            for state in self.connections.values():
+                self._enqueue(state, key, payload)
+        # Patches differ per client, so each is diffed when its turn comes;
+        # a dropped one is covered by the next, as last_sent stays put
+        snapshot, self._snapshot = self._snapshot, None
+        if snapshot is not None:
+            for state in self.connections.values():
+                state.snapshot = snapshot
+                self._enqueue(state, self.PATCH, None)
+
+    def _enqueue(self, state: ConnState, key, payload: Optional[bytes]):
+        pending = state.pending
+        pending.pop(key, None)
+        if len(pending) >= self.QUEUE_SIZE:
+            # Drop the oldest pending message in favour of the newest
+            del pending[next(iter(pending))]
+        pending[key] = payload
+        state.wakeup.set()
 
 
 ws_manager = WSManager()
@@ -105,36 +224,60 @@ ws_manager = WSManager()
 # ================================================================
 # Lifecycle
 # ================================================================
+# Tasks spawned from MQTT callbacks; strong references keep them alive
+# until done and let shutdown cancel whatever is still pending
+_bg_tasks: set = set()
+_main_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _spawn(coro):
+    """Schedule a coroutine on the server loop from any thread (e.g. paho's)."""
+    def _create():
+        task = asyncio.create_task(coro)
+        _bg_tasks.add(task)
+        task.add_done_callback(_bg_tasks.discard)
+
+    _main_loop.call_soon_threadsafe(_create)
+
+
 @app.on_event("startup")
 async def startup():
+    global _main_loop
     logger.info("Jarvis API server starting...")
+    _main_loop = asyncio.get_running_loop()
+    ensure_dirs()
 
     # Register state change callback for WebSocket broadcast
     async def on_state_change(old, new, reason):
+        _init_cache["ts"] = 0.0
         await ws_manager.broadcast({
             "type": "state_change",
             "data": {"from": old, "to": new, "reason": reason},
         })
+        # Clients already hold a snapshot; send each only changed fields
+        ws_manager.sync_state(_state_snapshot())
 
     jarvis_brain.on_state_change(on_state_change)
+    presence_service.on("presence_changed", lambda data: ws_manager.sync_state(_state_snapshot()))
+    _spawn(_state_sync_loop())
 
     # Start MQTT bridge
     mqtt_bridge.connect()
 
     # Register MQTT event handlers for Jarvis brain
-    mqtt_bridge.register_handler("intruder", lambda data: asyncio.create_task(
+    mqtt_bridge.register_handler("intruder", lambda data: _spawn(
         jarvis_brain._transition(JarvisState.INTRUDER_ALERT, f"MQTT intruder: {data.get('reason', 'unknown')}")
     ))
-    mqtt_bridge.register_handler("door", lambda data: asyncio.create_task(
+    mqtt_bridge.register_handler("door", lambda data: _spawn(
         ws_manager.broadcast({"type": "door_event", "data": data})
     ))
-    mqtt_bridge.register_handler("motion", lambda data: asyncio.create_task(
+    mqtt_bridge.register_handler("motion", lambda data: _spawn(
         ws_manager.broadcast({"type": "motion_event", "data": data})
     ))
-    mqtt_bridge.register_handler("person_detected", lambda data: asyncio.create_task(
+    mqtt_bridge.register_handler("person_detected", lambda data: _spawn(
         ws_manager.broadcast({"type": "person_detected", "data": data})
     ))
-    mqtt_bridge.register_handler("face_identified", lambda data: asyncio.create_task(
+    mqtt_bridge.register_handler("face_identified", lambda data: _spawn(
         ws_manager.broadcast({"type": "face_identified", "data": data})
     ))
     mqtt_bridge.register_handler("heartbeat", lambda data: 
@@ -148,7 +291,13 @@ async def startup():
 @app.on_event("shutdown")
 async def shutdown():
     mqtt_bridge.disconnect()
+    for task in list(_bg_tasks):
+        task.cancel()
+    await asyncio.gather(*_bg_tasks, return_exceptions=True)
     await jarvis_brain.stop()
+    await esp32_manager.close()
+    await home_service.close()
+    face_service.shutdown()
     logger.info("Jarvis API server stopped")
 
 
@@ -217,24 +366,25 @@ async def command_history(limit: int = Query(20)):
 # ================================================================
 # Face Recognition Routes
 # ================================================================
+async def _decode_upload(file: UploadFile) -> np.ndarray:
+    """Decode an uploaded image off the event loop."""
+    # np.frombuffer wraps the uploaded bytes without copying them
+    arr = np.frombuffer(await file.read(), np.uint8)
+    frame = await asyncio.to_thread(cv2.imdecode, arr, cv2.IMREAD_COLOR)
+    if frame is None:
+        raise HTTPException(400, "Invalid image")
+    return frame
+
+
 @app.post("/api/face/register-owner")
 async def register_owner_face(
     name: str = Query(default=None),
     file: UploadFile = File(...)
 ):
     """Register the owner's face from an uploaded image."""
-    import cv2
-    import numpy as np
-
-    contents = await file.read()
-    nparr = np.frombuffer(contents, np.uint8)
-    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-    if frame is None:
-        raise HTTPException(400, "Invalid image")
-
+    frame = await _decode_upload(file)
     owner_name = name or settings.OWNER_NAME
-    result = face_service.register_owner(frame, owner_name)
+    result = await asyncio.to_thread(face_service.register_owner, frame, owner_name)
 
     if result.get("success"):
         return {"status": "success", "name": owner_name, **result}
@@ -249,7 +399,7 @@ async def register_owner_from_camera(name: str = Query(default=None)):
         raise HTTPException(503, "Camera not available. Start the camera first via /api/camera/start")
 
     owner_name = name or settings.OWNER_NAME
-    result = face_service.register_owner(frame, owner_name)
+    result = await asyncio.to_thread(face_service.register_owner, frame, owner_name)
 
     if result.get("success"):
         return {"status": "success", "name": owner_name, **result}
@@ -263,30 +413,21 @@ async def register_known_person(
     file: UploadFile = File(...)
 ):
     """Register a known person's face."""
-    import cv2
-    import numpy as np
-
-    contents = await file.read()
-    nparr = np.frombuffer(contents, np.uint8)
-    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-    if frame is None:
-        raise HTTPException(400, "Invalid image")
-
-    success = face_service.register_known_person(name, role, frame)
-    if success:
+    frame = await _decode_upload(file)
+    result = await asyncio.to_thread(face_service.register_known_person, frame, name, role)
+    if result.get("success"):
         return {"status": "success", "name": name, "role": role}
-    raise HTTPException(400, "No face detected in image")
+    raise HTTPException(400, result.get("error", "No face detected in image"))
 
 
 @app.get("/api/face/recognize")
 async def recognize_current():
     """Recognize faces in the current camera frame."""
-    frame = camera_service.get_frame()
+    frame, small = camera_service.get_frames()
     if frame is None:
         raise HTTPException(503, "Camera not available")
 
-    results = face_service.recognize_faces(frame)
+    results = await face_service.recognize_faces_async(frame, small)
     return {"faces": results, "count": len(results)}
 
 
@@ -307,8 +448,8 @@ async def camera_snapshot():
     jpeg = camera_service.get_jpeg()
     if jpeg is None:
         raise HTTPException(503, "Camera not available")
-    return StreamingResponse(
-        iter([jpeg]),
+    return Response(
+        content=jpeg,
         media_type="image/jpeg",
         headers={"Cache-Control": "no-cache"},
     )
@@ -316,9 +457,10 @@ async def camera_snapshot():
 
 @app.post("/api/camera/record/start")
 async def start_recording():
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    path = os.path.join(settings.RECORDINGS_DIR, f"manual_{ts}.avi")
-    camera_service.start_recording(path)
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    path = camera_service.start_recording(f"manual_{ts}")
+    if not path:
+        raise HTTPException(500, "No video encoder available")
     return {"status": "recording", "path": path}
 
 
@@ -328,20 +470,22 @@ async def stop_recording():
     return {"status": "stopped"}
 
 
+_MJPEG_HEADER = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+_MJPEG_TRAILER = b"\r\n"
+
+
 @app.get("/api/camera/stream")
 async def camera_stream():
     """MJPEG stream endpoint."""
     async def generate():
         while True:
+            await camera_service.wait_for_frame()
             jpeg = camera_service.get_jpeg()
             if jpeg:
-                yield (
-                    b"--frame\r\n"
-                    b"Content-Type: image/jpeg\r\n\r\n" +
-                    jpeg +
-                    b"\r\n"
-                )
-            await asyncio.sleep(0.05)  # ~20fps
+                # Separate chunks avoid copying the JPEG into a new buffer
+                yield _MJPEG_HEADER
+                yield jpeg
+                yield _MJPEG_TRAILER
 
     return StreamingResponse(
         generate(),
@@ -366,47 +510,90 @@ async def intruder_records():
     return presence_service.get_intruder_records()
 
 
+_PHOTO_EXTENSIONS = (".jpg", ".png")
+# Intruder photo listing, rebuilt only when the directory's mtime changes
+_photos_cache = {"mtime": -1, "list": []}
+
+
+def _rebuild_photos_list(directory: str) -> list:
+    """Scan the intruder directory for photos (blocking)."""
+    with os.scandir(directory) as entries:
+        names = sorted(e.name for e in entries if e.name.endswith(_PHOTO_EXTENSIONS))
+    return [{
+        "filename": f,
+        "path": os.path.join(directory, f),
+        "url": f"/api/security/intruder-photo/{f}",
+    } for f in names]
+
+
 @app.get("/api/security/intruder-photos")
 async def intruder_photos():
     """List all intruder captured photos."""
-    photos = []
-    if os.path.exists(settings.INTRUDER_DIR):
-        for f in sorted(os.listdir(settings.INTRUDER_DIR)):
-            if f.endswith((".jpg", ".png")):
-                photos.append({
-                    "filename": f,
-                    "path": os.path.join(settings.INTRUDER_DIR, f),
-                    "url": f"/api/security/intruder-photo/{f}",
-                })
+    try:
+        mtime = os.stat(settings.INTRUDER_DIR).st_mtime_ns
+    except FileNotFoundError:
+        return []
+    if mtime == _photos_cache["mtime"]:
+        return _photos_cache["list"]
+
+    photos = await asyncio.to_thread(_rebuild_photos_list, settings.INTRUDER_DIR)
+    _photos_cache["mtime"] = mtime
+    _photos_cache["list"] = photos
     return photos
 
 
 @app.get("/api/security/intruder-photo/{filename}")
 async def get_intruder_photo(filename: str):
-    path = os.path.join(settings.INTRUDER_DIR, filename)
-    if os.path.exists(path):
-        return FileResponse(path, media_type="image/jpeg")
-    raise HTTPException(404, "Photo not found")
+    # Confine lookups to the intruder directory (rejects "../" traversal)
+    root = os.path.realpath(settings.INTRUDER_DIR)
+    path = os.path.realpath(os.path.join(root, filename))
+    if not path.startswith(root + os.sep):
+        raise HTTPException(404, "Photo not found")
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        raise HTTPException(404, "Photo not found")
+    # Hand the stat over so FileResponse doesn't stat the file again
+    return FileResponse(path, media_type="image/jpeg", stat_result=stat_result)
 
 
 # ================================================================
 # Home Automation Routes
 # ================================================================
+# Query parameter models: FastAPI validates each one once, as a whole, and
+# reports bad values as a 422 like a plain Query(...) parameter
+class RelayCmd(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    relay: int = Field(ge=1, le=8)
+    state: bool
+
+
+class RoomRelayCmd(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    room: str
+    state: bool
+
+
+class AllRelaysCmd(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    state: bool
+
+
 @app.post("/api/home/relay")
-async def control_relay(relay: int = Query(..., ge=1, le=8), state: bool = Query(...)):
-    result = await home_service.set_relay(relay, state)
+async def control_relay(cmd: Annotated[RelayCmd, Query()]):
+    result = await home_service.set_relay(cmd.relay, cmd.state)
     return result
 
 
 @app.post("/api/home/relay/room")
-async def control_room(room: str = Query(...), state: bool = Query(...)):
-    result = await home_service.set_relay_by_room(room, state)
+async def control_room(cmd: Annotated[RoomRelayCmd, Query()]):
+    result = await home_service.set_relay_by_room(cmd.room, cmd.state)
     return result
 
 
 @app.post("/api/home/relay/all")
-async def control_all(state: bool = Query(...)):
-    result = await home_service.set_all_relays(state)
+async def control_all(cmd: Annotated[AllRelaysCmd, Query()]):
+    result = await home_service.set_all_relays(cmd.state)
     return result
 
 
@@ -415,6 +602,11 @@ async def home_status():
     return await home_service.get_relay_status()
 
 
+@app.get("/api/home/status/full")
+async def home_full_status():
+    return await home_service.get_full_status()
+
+
 @app.get("/api/home/sensors")
 async def home_sensors():
     return await home_service.get_sensors()
@@ -625,8 +817,8 @@ async def esp32_cam_capture():
     """Capture a JPEG image from the camera."""
     image_data = await esp32_manager.capture_image()
     if image_data:
-        return StreamingResponse(
-            iter([image_data]),
+        return Response(
+            content=image_data,
             media_type="image/jpeg",
             headers={"Content-Disposition": "inline; filename=capture.jpg"}
         )
@@ -703,39 +895,76 @@ async def mqtt_buzz(pattern: str = Query("alert")):
 # ================================================================
 # WebSocket
 # ================================================================
+def _state_snapshot() -> dict:
+    """Full client-facing state, sent as "init" and diffed for "patch"."""
+    return {
+        "state": jarvis_brain.state.value,
+        "room": presence_service.get_state(),
+        # Copied: the brain updates its stats dict in place
+        "stats": dict(jarvis_brain.state_info.get("stats", {})),
+    }
+
+
+def _diff_snapshot(prev: dict, new: dict) -> dict:
+    """Field-level diff of two snapshots, one level into nested dicts."""
+    patch = {}
+    for key, value in new.items():
+        old = prev.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            changed = {f: v for f, v in value.items() if old.get(f) != v}
+            if changed:
+                patch[key] = changed
+        elif old != value:
+            patch[key] = value
+    return patch
+
+
+# Stats change without a callback; clients are patched at least this often
+_STATE_SYNC_INTERVAL = 1.0  # seconds
+
+
+async def _state_sync_loop():
+    while True:
+        await asyncio.sleep(_STATE_SYNC_INTERVAL)
+        if ws_manager.connections:
+            ws_manager.sync_state(_state_snapshot())
+
+
+# "init" snapshot and its serialized message, reused during reconnect
+# storms; reset on state change
+_INIT_CACHE_TTL = 0.25
+_init_cache = {"ts": 0.0, "snapshot": None, "payload": None}
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(ws: WebSocket):
-    await ws_manager.connect(ws)
-    logger.info("WebSocket client connected")
-
-    # Send initial state
-    await ws.send_json({
-        "type": "init",
-        "data": {
-            "state": jarvis_brain.state.value,
-            "room": presence_service.get_state(),
-            "stats": jarvis_brain.state_info.get("stats", {}),
-        },
-    })
+    # Initial state (shared across connects within the TTL)
+    now = time.monotonic()
+    if now - _init_cache["ts"] > _INIT_CACHE_TTL:
+        _init_cache["snapshot"] = _state_snapshot()
+        _init_cache["payload"] = _dumps({"type": "init", "data": _init_cache["snapshot"]})
+        _init_cache["ts"] = now
 
     try:
+        await ws_manager.connect(ws, _init_cache["snapshot"], _init_cache["payload"])
+        logger.info("WebSocket client connected")
         while True:
             data = await ws.receive_text()
-            msg = json.loads(data)
+            msg = _loads(data)
 
             if msg.get("type") == "command":
                 response = await jarvis_brain.process_voice_command(msg.get("text", ""))
-                await ws.send_json({
+                await ws.send_bytes(_dumps({
                     "type": "command_response",
                     "data": {"response": response, "state": jarvis_brain.state.value},
-                })
+                }))
 
             elif msg.get("type") == "ping":
-                await ws.send_json({"type": "pong"})
+                await ws.send_bytes(_dumps({"type": "pong"}))
 
     except WebSocketDisconnect:
-        ws_manager.disconnect(ws)
         logger.info("WebSocket client disconnected")
     except Exception as e:
-        ws_manager.disconnect(ws)
         logger.error(f"WebSocket error: {e}")
+    finally:
+        ws_manager.disconnect(ws)
@@ -2,6 +2,7 @@
 Jarvis AI - Configuration
 """
 import os
+from functools import lru_cache
 from pathlib import Path
 from pydantic_settings import BaseSettings
 from pydantic import Field
@@ -28,9 +29,12 @@ class JarvisSettings(BaseSettings):
 
     # ---- Face Recognition ----
     FACE_RECOGNITION_MODEL: str = "hog"  # hog (fast) or cnn (accurate)
+    FACE_USE_CUDA: bool = False  # cnn detector on the GPU; needs dlib built with CUDA
     FACE_ENCODING_TOLERANCE: float = 0.5  # Lower = stricter matching
     FACE_DETECTION_SCALE: float = 0.25  # Downscale for speed
     MIN_FACE_CONFIDENCE: float = 0.6
+    MIN_FACE_PIXELS: int = 60 * 60  # Smaller face boxes (full-frame area) are not encoded
+    FACE_RESULT_TTL: float = 0.1  # seconds recognition results are reused for a near-identical frame
     FACE_REGISTRATION_SAMPLES: int = 10  # Number of face samples to register
 
     # ---- Camera ----
@@ -70,6 +74,7 @@ class JarvisSettings(BaseSettings):
     MQTT_USERNAME: str = ""
     MQTT_PASSWORD: str = ""
     MQTT_CLIENT_ID: str = "jarvis-bridge"
+    MQTT_MSGPACK_COMMANDS: bool = False  # needs msgpack-aware ESP32 firmware
 
     # ---- MQTT Topics ----
     MQTT_TOPIC_PREFIX: str = "vision-ai/"
@@ -94,6 +99,7 @@ class JarvisSettings(BaseSettings):
     JARVIS_HOST: str = "0.0.0.0"
     JARVIS_PORT: int = 8100
     JARVIS_WS_PORT: int = 8101
+    ACCESS_LOG: bool = False  # per-request uvicorn access log lines
 
     class Config:
         env_file = ".env"
@@ -102,10 +108,24 @@ class JarvisSettings(BaseSettings):
         extra = "ignore"
 
 
-settings = JarvisSettings()
+@lru_cache(maxsize=1)
+def get_settings() -> JarvisSettings:
+    """Return the process-wide settings, parsed from the environment once."""
+    return JarvisSettings()
 
-# Create directories
-for d in [settings.DATA_DIR, settings.FACE_DB_DIR, settings.INTRUDER_DIR,
-          settings.RECORDINGS_DIR, settings.LOGS_DIR, settings.LEARNING_DIR,
-          settings.MODELS_DIR]:
-    Path(d).mkdir(parents=True, exist_ok=True)
+
+settings = get_settings()
+
+_dirs_ready = False
+
+
+def ensure_dirs():
+    """Create the data directories. Called once at startup, not on import."""
+    global _dirs_ready
+    if _dirs_ready:
+        return
+    for d in [settings.DATA_DIR, settings.FACE_DB_DIR, settings.INTRUDER_DIR,
+              settings.RECORDINGS_DIR, settings.LOGS_DIR, settings.LEARNING_DIR,
+              settings.MODELS_DIR]:
+        Path(d).mkdir(parents=True, exist_ok=True)
+    _dirs_ready = True
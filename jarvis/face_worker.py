@@ -0,0 +1,106 @@
+"""
+Jarvis AI - Face Worker
+========================
+Face detection, encoding and nearest-neighbour matching with no service
+state. Kept outside ``jarvis.services`` so the recognition worker
+processes import only cv2, numpy and face_recognition, not the package
+that builds every service singleton.
+"""
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    import face_recognition
+    FACE_REC_AVAILABLE = True
+except ImportError:
+    FACE_REC_AVAILABLE = False
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+
+ENCODING_DIM = 128
+
+
+# Nearest gallery row and its Euclidean distance, for each query encoding
+
+def _nearest_loop(gallery, sqnorm, queries):
+    # Same ranking as _nearest_numpy, |g|^2 - 2 g.q, as one fused
+    # multiply-add per element with rows spread over cores; only used when
+    # numba can compile it
+    n, dim = gallery.shape
+    best = np.empty(queries.shape[0], dtype=np.int64)
+    best_dist = np.empty(queries.shape[0], dtype=np.float32)
+    scores = np.empty(n, dtype=np.float32)
+    for k in range(queries.shape[0]):
+        for i in prange(n):
+            s = np.float32(0.0)
+            for j in range(dim):
+                s += gallery[i, j] * queries[k, j]
+            scores[i] = sqnorm[i] - np.float32(2.0) * s
+        i = scores.argmin()
+        best[k] = i
+        s = np.float32(0.0)
+        for j in range(dim):
+            d = gallery[i, j] - queries[k, j]
+            s += d * d
+        best_dist[k] = np.sqrt(s)
+    return best, best_dist
+
+
+def _nearest_numpy(gallery, sqnorm, queries):
+    # Rank references by |g|^2 - 2 g.q (the squared distance minus the
+    # per-query |q|^2): one SGEMM reads the gallery once instead of
+    # materialising a (K, N, 128) difference array.
+    best = (sqnorm - 2.0 * (queries @ gallery.T)).argmin(axis=1)
+    # Exact distance to each winner, so the tolerance test is unaffected
+    # by rounding in the expansion
+    return best, np.linalg.norm(gallery[best] - queries, axis=1)
+
+
+# cache=True keeps the compiled kernel on disk across restarts; nogil lets
+# matching on a worker thread run alongside the event loop and camera thread
+nearest = (njit(fastmath=True, parallel=True, nogil=True, cache=True)(_nearest_loop)
+           if NUMBA_AVAILABLE else _nearest_numpy)
+
+
+def encode_faces(rgb: np.ndarray, locations: List[Tuple],
+                 min_pixels: int = 0) -> List[Optional[np.ndarray]]:
+    """Encode each face box of at least ``min_pixels`` area; None for the
+    smaller ones, which would not give a usable encoding."""
+    big = [(b - t) * (r - l) >= min_pixels for (t, r, b, l) in locations]
+    encodings = iter(face_recognition.face_encodings(
+        rgb, [loc for loc, ok in zip(locations, big) if ok]) if any(big) else ())
+    return [next(encodings) if ok else None for ok in big]
+
+
+def detect_and_encode(frame: np.ndarray, small: Optional[np.ndarray], scale: float,
+                      model: str, min_pixels: int = 0) -> Tuple[List[Tuple], List[Optional[np.ndarray]]]:
+    """Locate and encode faces; the dlib-heavy half of recognition.
+
+    Without a pre-downscaled ``small``, the frame is converted to RGB once
+    and the detection image is resized from that, so detection and
+    encoding share one conversion. Faces under ``min_pixels`` get no
+    encoding, see encode_faces().
+    """
+    if small is None:
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        rgb_small = cv2.resize(rgb, (0, 0), fx=scale, fy=scale)
+    else:
+        rgb = None
+        rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+    locations = face_recognition.face_locations(rgb_small, model=model)
+    if not locations:
+        return [], []
+
+    up = 1.0 / scale
+    locations = [(int(t * up), int(r * up), int(b * up), int(l * up))
+                 for (t, r, b, l) in locations]
+    if rgb is None:
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    return locations, encode_faces(rgb, locations, min_pixels)
@@ -19,11 +19,24 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import uvicorn
 from loguru import logger
 
-from jarvis.config import settings
+try:
+    import uvloop  # noqa: F401
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
+
+try:
+    import httptools  # noqa: F401
+    HTTPTOOLS_AVAILABLE = True
+except ImportError:
+    HTTPTOOLS_AVAILABLE = False
+
+from jarvis.config import settings, ensure_dirs
 
 
 def configure_logging():
     """Configure loguru logging."""
+    ensure_dirs()
     log_dir = os.path.join(settings.DATA_DIR, "logs")
     os.makedirs(log_dir, exist_ok=True)
 
@@ -66,13 +79,17 @@ def main():
 
     logger.info("Starting Jarvis AI System...")
 
+    # One worker only: the camera, MQTT client and WebSocket clients all
+    # live in this process and must not be duplicated.
     uvicorn.run(
         "jarvis.api:app",
         host="0.0.0.0",
         port=settings.JARVIS_PORT,
         reload=False,
+        loop="uvloop" if UVLOOP_AVAILABLE else "asyncio",
+        http="httptools" if HTTPTOOLS_AVAILABLE else "h11",
         log_level="info",
-        access_log=True,
+        access_log=settings.ACCESS_LOG,
     )
 
 
@@ -6,35 +6,88 @@ Provides frames for face recognition and surveillance.
 """
 import os
 import time
+import asyncio
+import itertools
 import threading
 import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, Callable
+from typing import Optional, Callable, Iterator, Tuple
+from urllib.parse import urlsplit
 
 import cv2
+import httpx
 import numpy as np
 from loguru import logger
 
+try:
+    from turbojpeg import TurboJPEG, TJSAMP_420
+    _turbo = TurboJPEG()
+    TURBOJPEG_AVAILABLE = True
+except (ImportError, OSError, RuntimeError):
+    # Python binding or libjpeg-turbo shared library missing
+    TURBOJPEG_AVAILABLE = False
+
 from jarvis.config import settings
 
 
 class CameraService:
     """Manages camera capture from local or ESP32-CAM sources."""
 
+    MAX_STALE_GRABS = 4
+    STALE_GRAB_SECONDS = 0.005
+    # URL schemes of live network streams, whose buffered frames go stale
+    LIVE_STREAM_SCHEMES = ("rtsp://", "rtmp://", "http://", "https://", "udp://", "tcp://")
+    MAX_PENDING_WRITES = 16
+    JPEG_BUF_SIZE = 256 * 1024
+    FPS_WINDOW = 64
+    # Recording encoders in order of preference: (backend, fourcc, extension).
+    # FFmpeg's H.264 uses a hardware encoder when OpenCV was built with one.
+    VIDEO_CODECS = (
+        (cv2.CAP_FFMPEG, "avc1", ".mp4"),
+        (cv2.CAP_FFMPEG, "mp4v", ".mp4"),
+        (cv2.CAP_ANY, "XVID", ".avi"),
+    )
+
     def __init__(self):
         self._cap: Optional[cv2.VideoCapture] = None
-        self._frame: Optional[np.ndarray] = None
-        self._frame_lock = threading.Lock()
+        # (frame_count, frame) swapped in as one reference so readers
+        # always see a matching pair without taking a lock
+        self._latest: Tuple[int, Optional[np.ndarray]] = (0, None)
         self._running = False
         self._capture_thread: Optional[threading.Thread] = None
         self._frame_count = 0
-        self._fps = 0.0
-        self._last_fps_time = time.time()
-        self._fps_count = 0
+        # Capture timestamps (ns) of the last FPS_WINDOW frames
+        self._frame_times: deque = deque(maxlen=self.FPS_WINDOW)
         self._source = "none"
+        # Live device or network stream rather than a file; only these
+        # have driver-buffered frames worth draining
+        self._live = False
         self._frame_callbacks: list = []
+        self._callback_queues: list = []
         self._recording = False
         self._video_writer: Optional[cv2.VideoWriter] = None
+        self._video_codec_index = 0
+        # Snapshot names are "<session timestamp>_<counter>" so the clock is
+        # only formatted once per capture session
+        self._snap_base = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self._snap_seq = itertools.count()
+        # Snapshot encoding + disk writes run off the caller's thread
+        self._io_pool = ThreadPoolExecutor(max_workers=2,
+                                           thread_name_prefix="snapshot-io")
+        self._io_slots = threading.BoundedSemaphore(self.MAX_PENDING_WRITES)
+        self._http: Optional[httpx.Client] = None
+        self._esp32_stream: Optional[Iterator[int]] = None
+        # Reusable buffer each ESP32 JPEG is copied into before decoding
+        self._alloc_jpeg_buf(self.JPEG_BUF_SIZE)
+        # Pulsed from the capture thread so async consumers wake per frame
+        self._frame_event: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # (frame_count, quality, jpeg) of the most recently encoded frame
+        self._jpeg_cache: Optional[tuple] = None
+        # (frame_count, small) for the shared downscaled frame
+        self._small_cache: Optional[tuple] = None
 
         logger.info("Camera service initialized")
 
@@ -48,6 +101,9 @@ class CameraService:
             self.stop()
 
         self._source = source
+        self._live = source == "local" or source.lower().startswith(self.LIVE_STREAM_SCHEMES)
+        self._snap_base = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self._snap_seq = itertools.count()
 
         if source == "local":
             self._cap = cv2.VideoCapture(settings.CAMERA_INDEX)
@@ -55,12 +111,18 @@ class CameraService:
                 self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, settings.CAMERA_WIDTH)
                 self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, settings.CAMERA_HEIGHT)
                 self._cap.set(cv2.CAP_PROP_FPS, settings.CAMERA_FPS)
+                self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
                 logger.info(f"Local camera opened (index {settings.CAMERA_INDEX})")
             else:
                 logger.error("Failed to open local camera")
                 return False
         elif source == "esp32":
             self._cap = None  # Will use HTTP requests
+            # Long-lived client for the ESP32-CAM MJPEG stream
+            self._http = httpx.Client(
+                timeout=5,
+                limits=httpx.Limits(max_connections=1, keepalive_expiry=30),
+            )
             logger.info(f"ESP32-CAM source: {settings.ESP32_CAM_URL}")
         else:
             self._cap = cv2.VideoCapture(source)
@@ -81,6 +143,10 @@ class CameraService:
         if self._cap:
             self._cap.release()
             self._cap = None
+        self._close_esp32_stream()
+        if self._http:
+            self._http.close()
+            self._http = None
         if self._video_writer:
             self._video_writer.release()
             self._video_writer = None
@@ -93,17 +159,27 @@ class CameraService:
             try:
                 frame = self._read_frame()
                 if frame is not None:
-                    with self._frame_lock:
-                        self._frame = frame
+                    # Published frames are shared, so freeze them
+                    frame.setflags(write=False)
                     self._frame_count += 1
-                    self._update_fps()
+                    self._latest = (self._frame_count, frame)
+                    self._frame_times.append(time.monotonic_ns())
+                    self._notify_frame_ready()
 
-                    # Notify callbacks
-                    for cb in self._frame_callbacks:
+                    # Hand the frame to callback workers; a busy worker
+                    # keeps only the newest frame so capture never waits
+                    for q in self._callback_queues:
                         try:
-                            cb(frame)
-                        except Exception as e:
-                            logger.error(f"Frame callback error: {e}")
+                            q.put_nowait(frame)
+                        except queue.Full:
+                            try:
+                                q.get_nowait()
+                            except queue.Empty:
+                                pass
+                            try:
+                                q.put_nowait(frame)
+                            except queue.Full:
+                                pass
 
                     # Write to video if recording
                     if self._recording and self._video_writer:
@@ -123,70 +199,219 @@ class CameraService:
             return self._read_esp32_frame()
 
         if self._cap and self._cap.isOpened():
-            ret, frame = self._cap.read()
+            if not self._live:
+                # Files decode faster than STALE_GRAB_SECONDS, so every
+                # grab() would look stale; play them frame by frame
+                ret, frame = self._cap.read()
+                return frame if ret else None
+            # Drain frames the driver has already buffered: a grab() that
+            # returns almost immediately handed back a queued (stale) frame,
+            # so keep grabbing until one has to wait for the sensor.
+            for _ in range(self.MAX_STALE_GRABS):
+                start = time.perf_counter()
+                if not self._cap.grab():
+                    return None
+                if time.perf_counter() - start > self.STALE_GRAB_SECONDS:
+                    break
+            ret, frame = self._cap.retrieve()
             return frame if ret else None
         return None
 
     def _read_esp32_frame(self) -> Optional[np.ndarray]:
-        """Read frame from ESP32-CAM over HTTP."""
+        """Read the next frame from the ESP32-CAM MJPEG stream."""
         try:
-            import urllib.request
-            resp = urllib.request.urlopen(settings.ESP32_CAM_URL, timeout=5)
-            img_array = np.frombuffer(resp.read(), dtype=np.uint8)
-            frame = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-            return frame
+            if self._esp32_stream is None:
+                self._esp32_stream = self._esp32_stream_frames()
+            n = next(self._esp32_stream)
+            jpeg = self._jpeg_np[:n]
+            if TURBOJPEG_AVAILABLE:
+                return _turbo.decode(jpeg)
+            return cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
         except Exception as e:
+            # Stream ended or dropped; reconnect on the next read
             logger.debug(f"ESP32-CAM read failed: {e}")
+            self._close_esp32_stream()
             return None
 
-    def _update_fps(self):
-        """Track FPS."""
-        self._fps_count += 1
-        elapsed = time.time() - self._last_fps_time
-        if elapsed >= 1.0:
-            self._fps = self._fps_count / elapsed
-            self._fps_count = 0
-            self._last_fps_time = time.time()
+    def _esp32_stream_frames(self) -> Iterator[int]:
+        """Read JPEGs from the ESP32-CAM multipart stream over one connection.
+
+        Parts are split on the JPEG SOI/EOI markers. When several complete
+        frames are buffered only the newest is used, so a slow consumer
+        always gets the latest image instead of falling behind. Each JPEG is
+        copied into the reusable scratch buffer and its length is yielded;
+        read it back through ``self._jpeg_np[:n]``.
+        """
+        host = urlsplit(settings.ESP32_CAM_URL).hostname
+        url = f"http://{host}:{settings.ESP32_CAM_STREAM_PORT}/stream"
+        buf = bytearray()
+        with self._http.stream("GET", url) as resp:
+            resp.raise_for_status()
+            for chunk in resp.iter_bytes():
+                buf += chunk
+                end = buf.rfind(b"\xff\xd9")
+                if end < 0:
+                    continue
+                start = buf.rfind(b"\xff\xd8", 0, end)
+                n = end + 2 - start if start >= 0 else 0
+                if n:
+                    if n > len(self._jpeg_buf):
+                        self._alloc_jpeg_buf(n)
+                    with memoryview(buf) as view:
+                        self._jpeg_buf[:n] = view[start:end + 2]
+                del buf[:end + 2]
+                if n:
+                    yield n
+
+    def _alloc_jpeg_buf(self, size: int):
+        # Replaced rather than resized: a bytearray can't grow while the
+        # numpy view exports its memory
+        self._jpeg_buf = bytearray(max(size, self.JPEG_BUF_SIZE))
+        self._jpeg_np = np.frombuffer(self._jpeg_buf, dtype=np.uint8)
+
+    def _close_esp32_stream(self):
+        stream, self._esp32_stream = self._esp32_stream, None
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+    def _notify_frame_ready(self):
+        """Wake async frame waiters from the capture thread."""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._pulse_frame_event)
+
+    def _pulse_frame_event(self):
+        # set() releases every current waiter; clearing right away makes
+        # the next wait() block until the following frame
+        self._frame_event.set()
+        self._frame_event.clear()
 
     # ================================================================
     # Frame Access
     # ================================================================
     def get_frame(self) -> Optional[np.ndarray]:
-        """Get the latest frame (thread-safe copy)."""
-        with self._frame_lock:
-            return self._frame.copy() if self._frame is not None else None
+        """Get the latest frame (shared, read-only; use get_frame_copy to modify)."""
+        return self._latest[1]
+
+    def get_frames(self) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """Get the latest (full, small) frame pair.
+
+        The small frame is downscaled by FACE_DETECTION_SCALE once per
+        captured frame and shared read-only by every consumer.
+        """
+        seq, frame = self._latest
+        if frame is None:
+            return None, None
+
+        cached = self._small_cache
+        if cached is not None and cached[0] == seq:
+            return frame, cached[1]
+
+        small = cv2.resize(frame, (0, 0),
+                           fx=settings.FACE_DETECTION_SCALE,
+                           fy=settings.FACE_DETECTION_SCALE,
+                           interpolation=cv2.INTER_AREA)
+        small.setflags(write=False)
+        self._small_cache = (seq, small)
+        return frame, small
+
+    def get_small_frame(self) -> Optional[np.ndarray]:
+        """Get the latest frame downscaled by FACE_DETECTION_SCALE (read-only)."""
+        return self.get_frames()[1]
+
+    def get_frame_copy(self) -> Optional[np.ndarray]:
+        """Get a writable copy of the latest frame."""
+        frame = self._latest[1]
+        return frame.copy() if frame is not None else None
 
     def get_jpeg(self, quality: int = 80) -> Optional[bytes]:
-        """Get latest frame as JPEG bytes."""
-        frame = self.get_frame()
-        if frame is not None:
+        """Get latest frame as JPEG bytes.
+
+        Each frame is encoded once and the same bytes object is shared by
+        every caller (e.g. all MJPEG clients) until the next frame arrives.
+        """
+        seq, frame = self._latest
+        if frame is None:
+            return None
+
+        cached = self._jpeg_cache
+        if cached is not None and cached[0] == seq and cached[1] == quality:
+            return cached[2]
+
+        if TURBOJPEG_AVAILABLE:
+            jpeg = _turbo.encode(frame, quality=quality, jpeg_subsample=TJSAMP_420)
+        else:
             _, buffer = cv2.imencode(".jpg", frame,
                                      [cv2.IMWRITE_JPEG_QUALITY, quality])
-            return buffer.tobytes()
-        return None
+            jpeg = buffer.tobytes()
+        self._jpeg_cache = (seq, quality, jpeg)
+        return jpeg
+
+    async def wait_for_frame(self):
+        """Wait until the capture thread publishes a new frame."""
+        if self._frame_event is None:
+            self._loop = asyncio.get_running_loop()
+            self._frame_event = asyncio.Event()
+        await self._frame_event.wait()
 
     def on_frame(self, callback: Callable):
-        """Register a callback for every new frame."""
+        """Register a callback for new frames.
+
+        Each callback runs on its own worker thread and is handed the most
+        recent frame; frames arriving while it is busy are skipped.
+        """
+        q: queue.Queue = queue.Queue(maxsize=1)
+        worker = threading.Thread(target=self._callback_worker,
+                                  args=(callback, q), daemon=True)
         self._frame_callbacks.append(callback)
+        self._callback_queues.append(q)
+        worker.start()
+
+    def _callback_worker(self, callback: Callable, q: queue.Queue):
+        while True:
+            frame = q.get()
+            try:
+                callback(frame)
+            except Exception as e:
+                logger.error(f"Frame callback error: {e}")
 
     # ================================================================
     # Recording
     # ================================================================
     def start_recording(self, filename: str = None) -> str:
-        """Start recording video."""
+        """Start recording video and return the file path.
+
+        The extension of ``filename`` is replaced to match the encoder in use.
+        """
         if self._recording:
             return self._current_recording_path
 
         if not filename:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"recording_{timestamp}.avi"
+            filename = f"recording_{timestamp}"
+
+        base = os.path.splitext(os.path.join(settings.RECORDINGS_DIR, filename))[0]
+        size = (settings.CAMERA_WIDTH, settings.CAMERA_HEIGHT)
+        for codec in self.VIDEO_CODECS[self._video_codec_index:]:
+            backend, fourcc, ext = codec
+            filepath = base + ext
+            writer = cv2.VideoWriter(filepath, backend,
+                                     cv2.VideoWriter_fourcc(*fourcc), 20.0, size)
+            if writer.isOpened():
+                break
+            writer.release()
+            # Don't probe an unavailable encoder again
+            self._video_codec_index += 1
+            logger.debug(f"Video codec {fourcc} unavailable, trying next")
+        else:
+            self._video_codec_index = 0
+            logger.error("No usable video encoder, recording not started")
+            return ""
 
-        filepath = os.path.join(settings.RECORDINGS_DIR, filename)
-        fourcc = cv2.VideoWriter_fourcc(*"XVID")
-        self._video_writer = cv2.VideoWriter(
-            filepath, fourcc, 20.0,
-            (settings.CAMERA_WIDTH, settings.CAMERA_HEIGHT)
-        )
+        self._video_writer = writer
         self._recording = True
         self._current_recording_path = filepath
         logger.info(f"Recording started: {filepath}")
@@ -207,17 +432,35 @@ class CameraService:
         return path
 
     def capture_snapshot(self, suffix: str = "") -> Optional[str]:
-        """Capture a single snapshot."""
+        """Capture a single snapshot.
+
+        The file is written in the background; the path is returned
+        immediately. Returns None when no frame is available or too many
+        writes are already pending.
+        """
         frame = self.get_frame()
         if frame is None:
             return None
+        if not self._io_slots.acquire(blocking=False):
+            logger.warning("Snapshot dropped: disk writes are backed up")
+            return None
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        timestamp = f"{self._snap_base}_{next(self._snap_seq):06d}"
         filename = f"snapshot_{suffix}_{timestamp}.jpg" if suffix else f"snapshot_{timestamp}.jpg"
         filepath = os.path.join(settings.RECORDINGS_DIR, filename)
-        cv2.imwrite(filepath, frame)
+        # Frames are read-only and never mutated, so no copy is needed
+        self._io_pool.submit(self._write_image, filepath, frame)
         return filepath
 
+    def _write_image(self, filepath: str, frame: np.ndarray):
+        try:
+            if not cv2.imwrite(filepath, frame):
+                logger.error(f"Failed to write snapshot: {filepath}")
+        except Exception as e:
+            logger.error(f"Snapshot write error: {e}")
+        finally:
+            self._io_slots.release()
+
     # ================================================================
     # Status
     # ================================================================
@@ -227,7 +470,11 @@ class CameraService:
 
     @property
     def fps(self) -> float:
-        return round(self._fps, 1)
+        times = self._frame_times
+        if len(times) < 2:
+            return 0.0
+        span = times[-1] - times[0]
+        return round((len(times) - 1) * 1e9 / span, 1) if span else 0.0
 
     @property
     def frame_count(self) -> int:
@@ -240,7 +487,7 @@ class CameraService:
             "fps": self.fps,
             "frame_count": self._frame_count,
             "recording": self._recording,
-            "has_frame": self._frame is not None
+            "has_frame": self._latest[1] is not None
         }
 
 
@@ -5,122 +5,244 @@ Advanced natural language command parsing and routing.
 Maps voice/text commands to actions across all services.
 """
 import re
+from collections import deque
+from functools import lru_cache
+from itertools import islice
 from typing import Optional, Dict, Tuple
 from datetime import datetime
+from enum import IntEnum
 
 from loguru import logger
 
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    HYPERSCAN_AVAILABLE = False
+
 from jarvis.config import settings
 
 
-class CommandCategory:
-    HOME = "home"
-    SECURITY = "security"
-    SYSTEM = "system"
-    CAMERA = "camera"
-    CONVERSATION = "conversation"
-    INFORMATION = "information"
-    FACE = "face"
-    UNKNOWN = "unknown"
+class CommandCategory(IntEnum):
+    HOME = 0
+    SECURITY = 1
+    SYSTEM = 2
+    CAMERA = 3
+    CONVERSATION = 4
+    INFORMATION = 5
+    FACE = 6
+    UNKNOWN = 7
+
+
+# Category value -> the lower-case name parse results carry
+_CATEGORY_LABELS = tuple(c.name.lower() for c in CommandCategory)
 
 
-# Pattern → (category, action, params_extractor)
+# (pattern, category, action, keywords). A pattern can only match text that
+# contains at least one of its keywords (lowercase literals).
 COMMAND_PATTERNS = [
     # ---- Home Automation ----
-    (r"turn\s+(on|off)\s+(?:the\s+)?(.*?)(?:\s+light[s]?|\s+relay)?$", CommandCategory.HOME, "toggle_device"),
-    (r"(switch|set)\s+(on|off)\s+(?:the\s+)?(.*)", CommandCategory.HOME, "toggle_device"),
-    (r"all\s+lights?\s+(on|off)", CommandCategory.HOME, "all_lights"),
-    (r"(turn|switch)\s+(on|off)\s+(?:all|everything)", CommandCategory.HOME, "all_lights"),
-    (r"relay\s+(\d+)\s+(on|off)", CommandCategory.HOME, "relay_number"),
-    (r"scene\s+(\d+)", CommandCategory.HOME, "scene"),
-    (r"save\s+scene\s+(\d+)", CommandCategory.HOME, "save_scene"),
-    (r"(?:what(?:'s| is)\s+the\s+)?temperature", CommandCategory.HOME, "temperature"),
-    (r"(?:what(?:'s| is)\s+the\s+)?humidity", CommandCategory.HOME, "humidity"),
-    (r"(?:power|voltage|current|electricity)", CommandCategory.HOME, "power"),
-    (r"(buzz|beep|alarm|alert)", CommandCategory.HOME, "buzzer"),
+    (r"turn\s+(on|off)\s+(?:the\s+)?(.*?)(?:\s+light[s]?|\s+relay)?$", CommandCategory.HOME, "toggle_device", ("turn",)),
+    (r"(switch|set)\s+(on|off)\s+(?:the\s+)?(.*)", CommandCategory.HOME, "toggle_device", ("switch", "set")),
+    (r"all\s+lights?\s+(on|off)", CommandCategory.HOME, "all_lights", ("light",)),
+    (r"(turn|switch)\s+(on|off)\s+(?:all|everything)", CommandCategory.HOME, "all_lights", ("turn", "switch")),
+    (r"relay\s+(\d+)\s+(on|off)", CommandCategory.HOME, "relay_number", ("relay",)),
+    (r"scene\s+(\d+)", CommandCategory.HOME, "scene", ("scene",)),
+    (r"save\s+scene\s+(\d+)", CommandCategory.HOME, "save_scene", ("scene",)),
+    (r"(?:what(?:'s| is)\s+the\s+)?temperature", CommandCategory.HOME, "temperature", ("temperature",)),
+    (r"(?:what(?:'s| is)\s+the\s+)?humidity", CommandCategory.HOME, "humidity", ("humidity",)),
+    (r"(?:power|voltage|current|electricity)", CommandCategory.HOME, "power", ("power", "voltage", "current", "electricity")),
+    (r"(buzz|beep|alarm|alert)", CommandCategory.HOME, "buzzer", ("buzz", "beep", "alarm", "alert")),
 
     # ---- Security ----
-    (r"(?:any\s+)?intruder[s]?", CommandCategory.SECURITY, "intruder_check"),
-    (r"security\s+(?:status|report|check)", CommandCategory.SECURITY, "security_status"),
-    (r"who\s+(?:came|entered|visited|was\s+here)", CommandCategory.SECURITY, "visitor_log"),
-    (r"show\s+(?:intruder|security)\s+(?:photos?|images?|records?)", CommandCategory.SECURITY, "intruder_gallery"),
-    (r"lock\s*down", CommandCategory.SECURITY, "lockdown"),
+    (r"(?:any\s+)?intruder[s]?", CommandCategory.SECURITY, "intruder_check", ("intruder",)),
+    (r"security\s+(?:status|report|check)", CommandCategory.SECURITY, "security_status", ("security",)),
+    (r"who\s+(?:came|entered|visited|was\s+here)", CommandCategory.SECURITY, "visitor_log", ("who",)),
+    (r"show\s+(?:intruder|security)\s+(?:photos?|images?|records?)", CommandCategory.SECURITY, "intruder_gallery", ("show",)),
+    (r"lock\s*down", CommandCategory.SECURITY, "lockdown", ("lock",)),
 
     # ---- Camera ----
-    (r"(?:take|capture)\s+(?:a\s+)?(?:photo|picture|snapshot|image)", CommandCategory.CAMERA, "snapshot"),
-    (r"start\s+recording", CommandCategory.CAMERA, "start_recording"),
-    (r"stop\s+recording", CommandCategory.CAMERA, "stop_recording"),
-    (r"show\s+(?:the\s+)?(?:camera|video|feed|live)", CommandCategory.CAMERA, "live_feed"),
+    (r"(?:take|capture)\s+(?:a\s+)?(?:photo|picture|snapshot|image)", CommandCategory.CAMERA, "snapshot", ("take", "capture")),
+    (r"start\s+recording", CommandCategory.CAMERA, "start_recording", ("recording",)),
+    (r"stop\s+recording", CommandCategory.CAMERA, "stop_recording", ("recording",)),
+    (r"show\s+(?:the\s+)?(?:camera|video|feed|live)", CommandCategory.CAMERA, "live_feed", ("show",)),
 
     # ---- Face Recognition ----
-    (r"(?:register|learn|remember|save)\s+(?:my\s+)?face", CommandCategory.FACE, "register_face"),
-    (r"who\s+am\s+i", CommandCategory.FACE, "identify"),
-    (r"identify\s+(?:me|this\s+person)", CommandCategory.FACE, "identify"),
-    (r"(?:add|register)\s+(?:a\s+)?(?:new\s+)?(?:person|face|user)\s+(.*)", CommandCategory.FACE, "register_person"),
-    (r"how\s+many\s+faces?\s+(?:do\s+you\s+)?know", CommandCategory.FACE, "face_count"),
+    (r"(?:register|learn|remember|save)\s+(?:my\s+)?face", CommandCategory.FACE, "register_face", ("face",)),
+    (r"who\s+am\s+i", CommandCategory.FACE, "identify", ("who",)),
+    (r"identify\s+(?:me|this\s+person)", CommandCategory.FACE, "identify", ("identify",)),
+    (r"(?:add|register)\s+(?:a\s+)?(?:new\s+)?(?:person|face|user)\s+(.*)", CommandCategory.FACE, "register_person", ("person", "face", "user")),
+    (r"how\s+many\s+faces?\s+(?:do\s+you\s+)?know", CommandCategory.FACE, "face_count", ("face",)),
 
     # ---- System ----
-    (r"(?:system\s+)?status", CommandCategory.SYSTEM, "status"),
-    (r"how\s+are\s+you", CommandCategory.SYSTEM, "status"),
-    (r"go\s+to\s+sleep|sleep\s+mode|goodnight|good\s+night", CommandCategory.SYSTEM, "sleep"),
-    (r"wake\s+up|good\s+morning", CommandCategory.SYSTEM, "wake"),
-    (r"shut\s*down|power\s+off|stop", CommandCategory.SYSTEM, "shutdown"),
-    (r"restart|reboot", CommandCategory.SYSTEM, "restart"),
-    (r"what\s+can\s+you\s+do|help|commands", CommandCategory.SYSTEM, "help"),
-    (r"version|about", CommandCategory.SYSTEM, "about"),
-    (r"mute|quiet|silent", CommandCategory.SYSTEM, "mute"),
-    (r"unmute|speak|talk", CommandCategory.SYSTEM, "unmute"),
+    (r"(?:system\s+)?status", CommandCategory.SYSTEM, "status", ("status",)),
+    (r"how\s+are\s+you", CommandCategory.SYSTEM, "status", ("how",)),
+    (r"go\s+to\s+sleep|sleep\s+mode|goodnight|good\s+night", CommandCategory.SYSTEM, "sleep", ("sleep", "night")),
+    (r"wake\s+up|good\s+morning", CommandCategory.SYSTEM, "wake", ("wake", "morning")),
+    (r"shut\s*down|power\s+off|stop", CommandCategory.SYSTEM, "shutdown", ("shut", "power", "stop")),
+    (r"restart|reboot", CommandCategory.SYSTEM, "restart", ("restart", "reboot")),
+    (r"what\s+can\s+you\s+do|help|commands", CommandCategory.SYSTEM, "help", ("can", "help", "commands")),
+    (r"version|about", CommandCategory.SYSTEM, "about", ("version", "about")),
+    (r"mute|quiet|silent", CommandCategory.SYSTEM, "mute", ("mute", "quiet", "silent")),
+    (r"unmute|speak|talk", CommandCategory.SYSTEM, "unmute", ("unmute", "speak", "talk")),
 
     # ---- Information ----
-    (r"what\s+time\s+is\s+it|(?:current\s+)?time", CommandCategory.INFORMATION, "time"),
-    (r"what(?:'s| is)\s+(?:today(?:'s)?\s+)?date|today", CommandCategory.INFORMATION, "date"),
-    (r"(?:what(?:'s| is)\s+the\s+)?weather", CommandCategory.INFORMATION, "weather"),
+    (r"what\s+time\s+is\s+it|(?:current\s+)?time", CommandCategory.INFORMATION, "time", ("time",)),
+    (r"what(?:'s| is)\s+(?:today(?:'s)?\s+)?date|today", CommandCategory.INFORMATION, "date", ("date", "today")),
+    (r"(?:what(?:'s| is)\s+the\s+)?weather", CommandCategory.INFORMATION, "weather", ("weather",)),
 
     # ---- Conversation ----
-    (r"^(?:hello|hi|hey|greetings)\b", CommandCategory.CONVERSATION, "greeting"),
-    (r"(?:thank|thanks)", CommandCategory.CONVERSATION, "thanks"),
-    (r"(?:bye|goodbye|see\s+you|later)", CommandCategory.CONVERSATION, "farewell"),
-    (r"(?:good|nice|great|awesome|cool|perfect)", CommandCategory.CONVERSATION, "positive"),
-    (r"(?:sorry|oops|my\s+bad)", CommandCategory.CONVERSATION, "apology"),
+    (r"^(?:hello|hi|hey|greetings)\b", CommandCategory.CONVERSATION, "greeting", ("hello", "hi", "hey", "greetings")),
+    (r"(?:thank|thanks)", CommandCategory.CONVERSATION, "thanks", ("thank",)),
+    (r"(?:bye|goodbye|see\s+you|later)", CommandCategory.CONVERSATION, "farewell", ("bye", "see", "later")),
+    (r"(?:good|nice|great|awesome|cool|perfect)", CommandCategory.CONVERSATION, "positive", ("good", "nice", "great", "awesome", "cool", "perfect")),
+    (r"(?:sorry|oops|my\s+bad)", CommandCategory.CONVERSATION, "apology", ("sorry", "oops", "bad")),
 ]
 
+# Compiled once per process; the pattern table is static.
+_COMPILED = [(re.compile(p, re.IGNORECASE), cat, action) for p, cat, action, _ in COMMAND_PATTERNS]
+
+# Keyword prefilter: one scan finds every keyword occurrence (the lookahead
+# lets matches overlap). Only the longest keyword at a position is reported,
+# so each keyword also maps to the patterns of any keyword it contains
+# ("unmute" -> the "mute" pattern too).
+_KEYWORDS = {kw for *_, kws in COMMAND_PATTERNS for kw in kws}
+_KEYWORD_RE = re.compile(
+    "(?=(" + "|".join(map(re.escape, sorted(_KEYWORDS, key=len, reverse=True))) + "))")
+_KEYWORD_PATTERNS = {
+    kw: frozenset(i for i, (*_, kws) in enumerate(COMMAND_PATTERNS) if any(k in kw for k in kws))
+    for kw in _KEYWORDS
+}
+# Fixed parts of the fallback results; parse() only adds "raw"
+_EMPTY_TEMPLATE = {"category": _CATEGORY_LABELS[CommandCategory.UNKNOWN], "action": "empty", "params": {}}
+_UNKNOWN_TEMPLATE = {"category": _CATEGORY_LABELS[CommandCategory.UNKNOWN], "action": "unknown", "params": {}, "confidence": 0.0}
+
+_ALWAYS = frozenset(i for i, (*_, kws) in enumerate(COMMAND_PATTERNS) if not kws)
+
+# Lead-in for each pattern's branch in the fused regex: unanchored patterns
+# scan forward to any position, while "^" patterns can only match at the
+# start and are tried there once instead of at every offset.
+_SCAN_PREFIX = ["" if p.startswith("^") else r"[\s\S]*?" for p, *_ in COMMAND_PATTERNS]
+
+# State words accepted by extract_device_info
+_ON_WORDS = frozenset({"on", "enable", "activate", "1", "true", "yes"})
+
 
 class CommandProcessor:
     """Parses and categorizes natural language commands."""
 
+    MATCHER_CACHE_SIZE = 256
+    PARSE_CACHE_SIZE = 1024
+
     def __init__(self):
-        self._compiled = [(re.compile(p, re.IGNORECASE), cat, action) for p, cat, action in COMMAND_PATTERNS]
-        self._history: list = []
+        self._compiled = _COMPILED
+        self._keyword_re = _KEYWORD_RE
+        self._keyword_patterns = _KEYWORD_PATTERNS
+        self._always = _ALWAYS
+        # candidate set -> (combined regex, branches)
+        self._matchers: Dict[frozenset, Tuple] = {}
+        self._hs_db = self._build_hyperscan_db() if HYPERSCAN_AVAILABLE else None
+        # Utterances repeat a lot; memoize the result template per (stripped) text
+        self._template_cached = lru_cache(maxsize=self.PARSE_CACHE_SIZE)(self._template)
+        self._history: deque = deque(maxlen=500)
         logger.info(f"Command processor loaded with {len(self._compiled)} patterns")
 
-    def parse(self, text: str) -> Dict:
-        """Parse a command into category, action, and extracted params."""
-        text = text.strip()
-        if not text:
-            return {"category": CommandCategory.UNKNOWN, "action": "empty", "params": {}, "raw": text}
+    def _matcher(self, candidates: frozenset) -> Tuple:
+        """Build (or reuse) one regex fusing the candidate patterns.
+
+        Each pattern sits in its own lookahead branch, tried in list order,
+        so the first pattern to match anywhere in the text wins -- the same
+        result as searching them one by one, in a single C-level match.
+        """
+        matcher = self._matchers.get(candidates)
+        if matcher is None:
+            order = sorted(candidates)
+            combined = re.compile(
+                "|".join(rf"(?={_SCAN_PREFIX[i]}(?P<p{i}>{COMMAND_PATTERNS[i][0]}))" for i in order),
+                re.IGNORECASE,
+            )
+            # group name -> (category, action, slice of match.groups() holding
+            # the pattern's own groups, which directly follow its named group)
+            branches = {}
+            for i in order:
+                pattern, category, action = self._compiled[i]
+                first = combined.groupindex[f"p{i}"]
+                branches[f"p{i}"] = (category, action, slice(first, first + pattern.groups))
+            if len(self._matchers) >= self.MATCHER_CACHE_SIZE:
+                self._matchers.clear()
+            matcher = self._matchers[candidates] = (combined, branches)
+        return matcher
+
+    def _build_hyperscan_db(self):
+        """Compile every pattern into one Hyperscan DFA database, id = list index."""
+        try:
+            db = hyperscan.Database()
+            db.compile(
+                expressions=[p.encode() for p, _, _, _ in COMMAND_PATTERNS],
+                ids=list(range(len(COMMAND_PATTERNS))),
+                elements=len(COMMAND_PATTERNS),
+                flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP]
+                      * len(COMMAND_PATTERNS),
+            )
+            return db
+        except Exception as e:
+            logger.warning(f"Hyperscan compile failed, using re: {e}")
+            return None
 
-        for pattern, category, action in self._compiled:
+    def _match_hyperscan(self, text: str) -> Optional[Tuple]:
+        # One DFA pass reports every pattern that matches; the lowest id is
+        # the first in list order. Hyperscan has no capture groups, so that
+        # pattern is re-run with re to extract them (moving on to the next
+        # hit in the rare case re's semantics disagree).
+        hits = set()
+        self._hs_db.scan(text.encode(), match_event_handler=lambda i, *_: hits.add(i))
+        for i in sorted(hits):
+            pattern, category, action = self._compiled[i]
             match = pattern.search(text)
             if match:
-                params = {"groups": match.groups(), "match": match.group(0)}
-                result = {
-                    "category": category,
-                    "action": action,
-                    "params": params,
-                    "raw": text,
-                    "confidence": 1.0,
-                }
-                self._history.append(result)
-                return result
-
-        # Fallback — unknown
-        result = {
-            "category": CommandCategory.UNKNOWN,
-            "action": "unknown",
-            "params": {},
-            "raw": text,
-            "confidence": 0.0,
+                return category, action, match.groups(), match.group(0)
+        return None
+
+    def _match(self, text: str) -> Optional[Tuple]:
+        """Return (category, action, groups, match text) for the first matching pattern."""
+        if self._hs_db is not None:
+            return self._match_hyperscan(text)
+        found = set(self._keyword_re.findall(text.lower()))
+        candidates = self._always.union(*(self._keyword_patterns[kw] for kw in found))
+        if not candidates:
+            return None
+        combined, branches = self._matcher(candidates)
+        match = combined.match(text)
+        if not match:
+            return None
+        name = match.lastgroup
+        category, action, groups = branches[name]
+        return category, action, match.groups()[groups], match.group(name)
+
+    def _template(self, text: str) -> Dict:
+        """Result fields for ``text``, minus "raw"; shared, treat as read-only."""
+        matched = self._match(text)
+        if not matched:
+            return _UNKNOWN_TEMPLATE
+        category, action, groups, match_text = matched
+        return {
+            "category": _CATEGORY_LABELS[category],
+            "action": action,
+            "params": {"groups": groups, "match": match_text},
+            "confidence": 1.0,
         }
+
+    def parse(self, text: str) -> Dict:
+        """Parse a command into category, action, and extracted params.
+
+        The returned dict is fresh, but its "params" is shared with other
+        results for the same text and must not be mutated.
+        """
+        text = text.strip()
+        if not text:
+            return {**_EMPTY_TEMPLATE, "raw": text}
+
+        result = {**self._template_cached(text), "raw": text}
         self._history.append(result)
         return result
 
@@ -132,16 +254,16 @@ class CommandProcessor:
         if action == "toggle_device" and len(groups) >= 2:
             state_word = groups[0].lower()
             device = groups[1].strip() if len(groups) > 1 else groups[-1].strip()
-            state = state_word in ("on", "enable", "activate")
+            state = state_word in _ON_WORDS
             return device, state
 
         if action == "all_lights" and len(groups) >= 1:
-            state = groups[0].lower() in ("on",)
+            state = groups[0].lower() in _ON_WORDS
             return "all", state
 
         if action == "relay_number" and len(groups) >= 2:
             relay_num = groups[0]
-            state = groups[1].lower() in ("on",)
+            state = groups[1].lower() in _ON_WORDS
             return f"relay_{relay_num}", state
 
         return None, None
@@ -160,7 +282,9 @@ class CommandProcessor:
         )
 
     def get_history(self, limit: int = 20) -> list:
-        return self._history[-limit:]
+        tail = list(islice(reversed(self._history), limit))
+        tail.reverse()
+        return tail
 
 
 # Singleton
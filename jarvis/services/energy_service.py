@@ -3,19 +3,60 @@ Jarvis Energy Monitoring Service
 Feature 28: Power consumption tracking
 Feature 29: Energy optimization recommendations
 """
+import sys
 import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
-from collections import defaultdict
+import numpy as np
 from loguru import logger
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+# Per-device (sum of watts, reading count) over readings at or after ``since``
+
+def _summarize_loop(ts, dev, watts, since, n_devices):
+    # Single fused pass; only used when numba can compile it
+    sums = np.zeros(n_devices, dtype=np.float64)
+    counts = np.zeros(n_devices, dtype=np.int64)
+    for k in range(ts.shape[0]):
+        if ts[k] >= since:
+            sums[dev[k]] += watts[k]
+            counts[dev[k]] += 1
+    return sums, counts
+
+
+def _summarize_numpy(ts, dev, watts, since, n_devices):
+    mask = ts >= since
+    d = dev[mask]
+    return (np.bincount(d, weights=watts[mask], minlength=n_devices),
+            np.bincount(d, minlength=n_devices))
+
+
+# cache=True keeps the compiled kernel on disk across restarts
+_summarize = njit(cache=True)(_summarize_loop) if NUMBA_AVAILABLE else _summarize_numpy
+
 
 class EnergyMonitorService:
     """Track and optimize energy consumption across devices."""
 
+    LOG_SIZE = 10000
+
     def __init__(self):
         self.device_power = {}  # device_id -> watts
-        self.consumption_log = []
+        # Consumption log as a ring of parallel arrays (epoch seconds,
+        # device index, watts) so summaries are vectorized numpy passes
+        self._log_ts = np.zeros(self.LOG_SIZE, dtype=np.float64)
+        self._log_dev = np.zeros(self.LOG_SIZE, dtype=np.int32)
+        self._log_watts = np.zeros(self.LOG_SIZE, dtype=np.float64)
+        self._log_written = 0  # readings ever logged; slot = count % LOG_SIZE
+        self._dev_ids: List[str] = []
+        self._dev_index: Dict[str, int] = {}
+        # Assigning builds _rate_by_hour, the tariff period per UTC hour
         self.tariff_schedule = {
             "peak": {"start": 17, "end": 21, "rate": 0.25},
             "off_peak": {"start": 23, "end": 7, "rate": 0.10},
@@ -28,60 +69,90 @@ class EnergyMonitorService:
 
     def update_power(self, device_id: str, watts: float, voltage: float = 220, current: float = 0):
         """Update real-time power reading from a device."""
+        now = time.time()
+        # Resolve to the device's table slot; the first-seen id string is
+        # kept as the one canonical key for every later reading
+        idx = self._dev_index.get(device_id)
+        if idx is None:
+            device_id = sys.intern(device_id)
+            idx = self._dev_index[device_id] = len(self._dev_ids)
+            self._dev_ids.append(device_id)
+        else:
+            device_id = self._dev_ids[idx]
         self.device_power[device_id] = {
             "watts": watts,
             "voltage": voltage,
             "current": current if current else watts / voltage,
-            "updated_at": datetime.utcnow().isoformat()
+            "updated_at": now  # epoch seconds; formatted when reported
         }
-        self.consumption_log.append({
-            "device_id": device_id,
-            "watts": watts,
-            "timestamp": datetime.utcnow().isoformat()
-        })
-        if len(self.consumption_log) > 10000:
-            self.consumption_log = self.consumption_log[-5000:]
+        slot = self._log_written % self.LOG_SIZE
+        self._log_ts[slot] = now
+        self._log_dev[slot] = idx
+        self._log_watts[slot] = watts
+        self._log_written += 1
 
     def get_current_usage(self) -> dict:
         """Get current power consumption summary."""
         total_watts = sum(d["watts"] for d in self.device_power.values())
+        rate = self._get_current_rate()
         return {
             "total_watts": round(total_watts, 1),
             "total_kw": round(total_watts / 1000, 3),
-            "devices": self.device_power,
+            "devices": {did: {**info, "updated_at": datetime.utcfromtimestamp(info["updated_at"]).isoformat()}
+                        for did, info in self.device_power.items()},
             "device_count": len(self.device_power),
             "estimated_daily_kwh": round(total_watts * 24 / 1000, 2),
-            "current_rate": self._get_current_rate(),
-            "estimated_daily_cost": round(total_watts * 24 / 1000 * self._get_current_rate()["rate"], 2),
+            "current_rate": rate,
+            "estimated_daily_cost": round(total_watts * 24 / 1000 * rate["rate"], 2),
             "timestamp": datetime.utcnow().isoformat()
         }
 
-    def _get_current_rate(self) -> dict:
-        hour = datetime.utcnow().hour
+    @property
+    def tariff_schedule(self) -> dict:
+        return self._tariff_schedule
+
+    @tariff_schedule.setter
+    def tariff_schedule(self, schedule: dict):
+        """Replace the schedule and rebuild the per-hour rate table.
+
+        Assign a new dict to change rates; editing the current one in
+        place does not rebuild the table.
+        """
+        self._tariff_schedule = schedule
+        self._rate_by_hour = self._build_rate_table()
+
+    def _build_rate_table(self) -> tuple:
         peak = self.tariff_schedule["peak"]
         off_peak = self.tariff_schedule["off_peak"]
-        if peak["start"] <= hour < peak["end"]:
-            return {"period": "peak", "rate": peak["rate"]}
-        if hour >= off_peak["start"] or hour < off_peak["end"]:
-            return {"period": "off_peak", "rate": off_peak["rate"]}
-        return {"period": "standard", "rate": self.tariff_schedule["standard"]["rate"]}
+        table = []
+        for hour in range(24):
+            if peak["start"] <= hour < peak["end"]:
+                table.append({"period": "peak", "rate": peak["rate"]})
+            elif hour >= off_peak["start"] or hour < off_peak["end"]:
+                table.append({"period": "off_peak", "rate": off_peak["rate"]})
+            else:
+                table.append({"period": "standard", "rate": self.tariff_schedule["standard"]["rate"]})
+        return tuple(table)
+
+    def _get_current_rate(self) -> dict:
+        return dict(self._rate_by_hour[time.gmtime().tm_hour])
 
     def get_daily_summary(self) -> dict:
         """Get today's energy consumption summary."""
-        today = datetime.utcnow().date().isoformat()
-        today_logs = [l for l in self.consumption_log if l["timestamp"].startswith(today)]
-        
-        by_device = defaultdict(list)
-        for log in today_logs:
-            by_device[log["device_id"]].append(log["watts"])
-        
+        now = time.time()
+        today = time.strftime("%Y-%m-%d", time.gmtime(now))
+        n = min(self._log_written, self.LOG_SIZE)
+        sums, counts = _summarize(self._log_ts[:n], self._log_dev[:n], self._log_watts[:n],
+                                  now - now % 86400,  # since UTC midnight
+                                  len(self._dev_ids))
+
         device_summary = {}
-        for did, watts_list in by_device.items():
-            avg_watts = sum(watts_list) / len(watts_list)
-            device_summary[did] = {
-                "avg_watts": round(avg_watts, 1),
-                "readings": len(watts_list),
-                "estimated_kwh": round(avg_watts * 24 / 1000, 2)
+        for i in np.flatnonzero(counts):
+            avg_watts = sums[i] / counts[i]
+            device_summary[self._dev_ids[i]] = {
+                "avg_watts": round(float(avg_watts), 1),
+                "readings": int(counts[i]),
+                "estimated_kwh": round(float(avg_watts) * 24 / 1000, 2)
             }
         
         total_estimated = sum(d["estimated_kwh"] for d in device_summary.values())
@@ -92,7 +163,7 @@ class EnergyMonitorService:
             "budget_remaining": round(self.daily_budget_kwh - total_estimated, 2),
             "within_budget": total_estimated <= self.daily_budget_kwh,
             "devices": device_summary,
-            "readings": len(today_logs)
+            "readings": int(counts.sum())
         }
 
     def get_optimization_tips(self) -> List[dict]:
@@ -122,7 +193,7 @@ class EnergyMonitorService:
 
     def get_stats(self) -> dict:
         return {
-            "total_readings": len(self.consumption_log),
+            "total_readings": min(self._log_written, self.LOG_SIZE),
             "active_devices": len(self.device_power),
             "daily_budget": self.daily_budget_kwh,
             "monthly_target": self.monthly_target_kwh
@@ -7,10 +7,16 @@ Provides unified interface for device control, monitoring, and OTA.
 import json
 import time
 import asyncio
+import functools
 import logging
 from typing import Dict, Optional, List, Any
 from dataclasses import dataclass, field
 
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
 try:
     import aiohttp
 except ImportError:
@@ -18,8 +24,43 @@ except ImportError:
 
 logger = logging.getLogger("jarvis.esp32_manager")
 
+PROBE_CACHE_TTL = 0.3  # seconds
+
+
+def _single_flight(fn):
+    """Share one device probe between concurrent callers and reuse its
+    result for PROBE_CACHE_TTL seconds, so N pollers cost one round trip.
+
+    Applied to the coroutines that hit the network; get_device_health()
+    and get_summary() only read in-memory state and need no cache.
+    """
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(self):
+        entry = self._flights.get(name)
+        if entry is not None:
+            expiry, task = entry
+            if not task.done() or time.monotonic() < expiry:
+                # shield: one caller giving up must not cancel the others
+                return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(fn(self))
+        self._flights[name] = (float("inf"), task)
+        generation = self._flight_generation
+
+        def cache(t):
+            # A command sent while the probe was in flight makes its result stale
+            if self._flight_generation == generation:
+                self._flights[name] = (time.monotonic() + PROBE_CACHE_TTL, t)
+
+        task.add_done_callback(cache)
+        return await asyncio.shield(task)
+
+    return wrapper
 
-@dataclass
+
+@dataclass(slots=True)
 class ESP32Device:
     """Represents a physical ESP32 device."""
     device_id: str
@@ -32,6 +73,16 @@ class ESP32Device:
     last_seen: float = 0.0
     capabilities: List[str] = field(default_factory=list)
     state: Dict[str, Any] = field(default_factory=dict)
+    # Request URL prefixes, rebuilt only when the address changes
+    host_url: str = field(default="", init=False, repr=False)
+    base_url: str = field(default="", init=False, repr=False)
+
+    def __post_init__(self):
+        self.refresh_urls()
+
+    def refresh_urls(self):
+        self.host_url = f"http://{self.ip}:{self.http_port}"
+        self.base_url = self.host_url + self.api_prefix
 
 
 class ESP32ManagerService:
@@ -43,8 +94,17 @@ class ESP32ManagerService:
     def __init__(self, mqtt_bridge=None):
         self.mqtt_bridge = mqtt_bridge
         self.devices: Dict[str, ESP32Device] = {}
+        self._by_ip: Dict[str, ESP32Device] = {}
         self._health_check_interval = 30  # seconds
         self._running = False
+        # method name -> (expiry, task) for _single_flight probes
+        self._flights: Dict[str, tuple] = {}
+        # Bumped by every command; probes started before it aren't cached
+        self._flight_generation = 0
+        # Shared keep-alive client (httpx, else aiohttp), created on first
+        # request inside the loop
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._session: Optional["aiohttp.ClientSession"] = None
 
         # Register default devices
         self.register_device(ESP32Device(
@@ -69,28 +129,74 @@ class ESP32ManagerService:
     def register_device(self, device: ESP32Device):
         """Register a new ESP32 device."""
         self.devices[device.device_id] = device
+        if device.ip:
+            self._by_ip[device.ip] = device
         logger.info(f"Registered device: {device.device_id} ({device.device_type}) at {device.ip}")
 
     def update_device_from_heartbeat(self, data: Dict):
         """Update device state from a heartbeat message."""
-        device_id = data.get("device", "")
-        for dev in self.devices.values():
-            if dev.device_id == device_id or dev.ip == data.get("ip", ""):
-                dev.online = True
-                dev.last_seen = time.time()
-                dev.firmware = data.get("firmware", dev.firmware)
-                dev.ip = data.get("ip", dev.ip)
-                dev.state = data
-                break
+        dev = self.devices.get(data.get("device", "")) or self._by_ip.get(data.get("ip", ""))
+        if dev is None:
+            return
+        dev.online = True
+        dev.last_seen = time.time()
+        dev.firmware = data.get("firmware", dev.firmware)
+        ip = data.get("ip", dev.ip)
+        if ip != dev.ip:
+            if self._by_ip.get(dev.ip) is dev:
+                del self._by_ip[dev.ip]
+            dev.ip = ip
+            dev.refresh_urls()
+            if ip:
+                self._by_ip[ip] = dev
+        dev.state = data
 
     # =========================================
     # HTTP API Helpers
     # =========================================
 
+    def _get_client(self) -> "httpx.AsyncClient":
+        """Return the shared httpx client, reusing connections to the boards."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=httpx.Limits(
+                max_connections=20, max_keepalive_connections=20, keepalive_expiry=30.0))
+        return self._client
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        """Return the shared aiohttp session (used when httpx is missing)."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(
+                limit=20, limit_per_host=4, ttl_dns_cache=300, keepalive_timeout=30))
+        return self._session
+
+    async def close(self):
+        """Close the shared HTTP client."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _request(self, method: str, url: str, params: Dict = None,
+                       timeout: float = 10, as_bytes: bool = False):
+        """Send one request on the shared client. Returns (status, body);
+        body is None unless the status is 200. Transport errors raise."""
+        if httpx is not None:
+            resp = await self._get_client().request(method, url, params=params, timeout=timeout)
+            if resp.status_code != 200:
+                return resp.status_code, None
+            return 200, resp.content if as_bytes else resp.json()
+        async with self._get_session().request(method, url, params=params,
+                                               timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+            if resp.status != 200:
+                return resp.status, None
+            return 200, await (resp.read() if as_bytes else resp.json())
+
     async def _http_get(self, device_id: str, path: str, timeout: int = 10) -> Optional[Dict]:
         """Make HTTP GET request to a device."""
-        if aiohttp is None:
-            logger.error("aiohttp not installed")
+        if httpx is None and aiohttp is None:
+            logger.error("httpx or aiohttp required")
             return None
 
         dev = self.devices.get(device_id)
@@ -98,15 +204,12 @@ class ESP32ManagerService:
             logger.error(f"Device not found: {device_id}")
             return None
 
-        url = f"http://{dev.ip}:{dev.http_port}{dev.api_prefix}{path}"
+        url = dev.base_url + path
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
-                    if resp.status == 200:
-                        return await resp.json()
-                    else:
-                        logger.warning(f"HTTP GET {url} returned {resp.status}")
-                        return None
+            status, data = await self._request("GET", url, timeout=timeout)
+            if status != 200:
+                logger.warning(f"HTTP GET {url} returned {status}")
+            return data
         except Exception as e:
             logger.error(f"HTTP GET {url} failed: {e}")
             dev.online = False
@@ -115,8 +218,8 @@ class ESP32ManagerService:
     async def _http_post(self, device_id: str, path: str,
                          params: Dict = None, timeout: int = 10) -> Optional[Dict]:
         """Make HTTP POST request to a device."""
-        if aiohttp is None:
-            logger.error("aiohttp not installed")
+        if httpx is None and aiohttp is None:
+            logger.error("httpx or aiohttp required")
             return None
 
         dev = self.devices.get(device_id)
@@ -124,29 +227,43 @@ class ESP32ManagerService:
             logger.error(f"Device not found: {device_id}")
             return None
 
-        url = f"http://{dev.ip}:{dev.http_port}{dev.api_prefix}{path}"
+        url = dev.base_url + path
+        # A command changes device state; don't serve pre-command probes
+        self._flight_generation += 1
+        self._flights.clear()
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, params=params,
-                                        timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
-                    if resp.status == 200:
-                        return await resp.json()
-                    else:
-                        logger.warning(f"HTTP POST {url} returned {resp.status}")
-                        return None
+            status, data = await self._request("POST", url, params=params, timeout=timeout)
+            if status != 200:
+                logger.warning(f"HTTP POST {url} returned {status}")
+            return data
         except Exception as e:
             logger.error(f"HTTP POST {url} failed: {e}")
             dev.online = False
             return None
 
+    async def _raw_get(self, device_id: str, path: str, timeout: float = 10,
+                       as_bytes: bool = False):
+        """GET a path on the device host, outside its API prefix."""
+        dev = self.devices.get(device_id)
+        if not dev:
+            return None
+        url = dev.host_url + path
+        try:
+            return (await self._request("GET", url, timeout=timeout, as_bytes=as_bytes))[1]
+        except Exception as e:
+            logger.error(f"HTTP GET {url} failed: {e}")
+        return None
+
     # =========================================
     # ESP32 Server Control (HTTP)
     # =========================================
 
+    @_single_flight
     async def get_server_status(self) -> Optional[Dict]:
         """Get full status from ESP32 server."""
         return await self._http_get("esp32-server-01", "/status")
 
+    @_single_flight
     async def get_sensors(self) -> Optional[Dict]:
         """Get sensor readings."""
         return await self._http_get("esp32-server-01", "/sensors")
@@ -165,6 +282,7 @@ class ESP32ManagerService:
         return await self._http_post("esp32-server-01", "/relays/all",
                                      {"state": "1" if state else "0"})
 
+    @_single_flight
     async def get_door_status(self) -> Optional[Dict]:
         """Get door sensor status."""
         return await self._http_get("esp32-server-01", "/door/status")
@@ -196,6 +314,7 @@ class ESP32ManagerService:
         return await self._http_post("esp32-server-01", "/schedules/delete",
                                      {"id": str(schedule_id)})
 
+    @_single_flight
     async def get_heartbeat(self) -> Optional[Dict]:
         """Get Jarvis heartbeat from server."""
         return await self._http_get("esp32-server-01", "/jarvis/heartbeat")
@@ -215,39 +334,17 @@ class ESP32ManagerService:
 
     async def get_jarvis_cam_status(self) -> Optional[Dict]:
         """Get Jarvis-specific camera status."""
-        dev = self.devices.get("esp32-cam-01")
-        if not dev:
-            return None
-        url = f"http://{dev.ip}:{dev.http_port}/jarvis/status"
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                    if resp.status == 200:
-                        return await resp.json()
-        except Exception as e:
-            logger.error(f"Camera jarvis status failed: {e}")
-        return None
+        return await self._raw_get("esp32-cam-01", "/jarvis/status")
 
     async def trigger_detection(self) -> Optional[Dict]:
         """Trigger a capture + AI detection."""
-        dev = self.devices.get("esp32-cam-01")
-        if not dev:
-            return None
-        url = f"http://{dev.ip}:{dev.http_port}/jarvis/detect"
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=15)) as resp:
-                    if resp.status == 200:
-                        return await resp.json()
-        except Exception as e:
-            logger.error(f"Camera detect failed: {e}")
-        return None
+        return await self._raw_get("esp32-cam-01", "/jarvis/detect", timeout=15)
 
     async def get_capture_url(self) -> Optional[str]:
         """Get the camera capture URL."""
         dev = self.devices.get("esp32-cam-01")
         if dev and dev.ip:
-            return f"http://{dev.ip}:{dev.http_port}/capture"
+            return dev.host_url + "/capture"
         return None
 
     async def get_stream_url(self) -> Optional[str]:
@@ -259,18 +356,7 @@ class ESP32ManagerService:
 
     async def capture_image(self) -> Optional[bytes]:
         """Capture a JPEG image from the camera."""
-        dev = self.devices.get("esp32-cam-01")
-        if not dev:
-            return None
-        url = f"http://{dev.ip}:{dev.http_port}/capture"
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                    if resp.status == 200:
-                        return await resp.read()
-        except Exception as e:
-            logger.error(f"Image capture failed: {e}")
-        return None
+        return await self._raw_get("esp32-cam-01", "/capture", as_bytes=True)
 
     # =========================================
     # MQTT-Based Control (via Bridge)
@@ -353,25 +439,24 @@ class ESP32ManagerService:
             }
         return result
 
+    @_single_flight
     async def health_check(self) -> Dict[str, bool]:
-        """Ping all devices to check if they're reachable."""
+        """Ping all devices concurrently to check if they're reachable."""
+        dev_ids = list(self.devices)
+        replies = await asyncio.gather(
+            *(self._http_get(dev_id, "/status") for dev_id in dev_ids),
+            return_exceptions=True
+        )
         results = {}
-        for dev_id, dev in self.devices.items():
-            try:
-                if dev.device_type == "server":
-                    data = await self._http_get(dev_id, "/status")
-                else:
-                    data = await self._http_get(dev_id, "/status")
-                if data:
-                    dev.online = True
-                    dev.last_seen = time.time()
-                    results[dev_id] = True
-                else:
-                    dev.online = False
-                    results[dev_id] = False
-            except Exception:
-                dev.online = False
-                results[dev_id] = False
+        now = time.time()
+        for dev_id, data in zip(dev_ids, replies):
+            # Exceptions and empty/non-object replies both count as down
+            ok = isinstance(data, dict) and bool(data)
+            dev = self.devices[dev_id]
+            dev.online = ok
+            if ok:
+                dev.last_seen = now
+            results[dev_id] = ok
         return results
 
     def get_summary(self) -> Dict:
@@ -9,49 +9,166 @@ import json
 import time
 import pickle
 import uuid
+import queue
+import atexit
+import asyncio
+import heapq
+import random
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
 import cv2
 import numpy as np
 from loguru import logger
 
 try:
+    import dlib
     import face_recognition
     FACE_REC_AVAILABLE = True
+    DLIB_USE_CUDA = bool(getattr(dlib, "DLIB_USE_CUDA", False))
 except ImportError:
     FACE_REC_AVAILABLE = False
+    DLIB_USE_CUDA = False
     logger.warning("face_recognition not installed. Using OpenCV fallback.")
 
+try:
+    from turbojpeg import TurboJPEG, TJSAMP_420
+    _turbo = TurboJPEG()
+    TURBOJPEG_AVAILABLE = True
+except (ImportError, OSError, RuntimeError):
+    # Python binding or libjpeg-turbo shared library missing
+    TURBOJPEG_AVAILABLE = False
+
 from jarvis.config import settings
+from jarvis.face_worker import ENCODING_DIM, detect_and_encode, encode_faces, nearest
+
+_ENCODING_BYTES = ENCODING_DIM * np.dtype(np.float32).itemsize
+
+
+def _cpu_has_avx() -> Optional[bool]:
+    """Whether the CPU supports AVX; None where /proc/cpuinfo is unavailable."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return "avx" in line.split()
+    except OSError:
+        pass
+    return None
+
+
+def _write_jpeg(path: str, image: np.ndarray, quality: int = 95):
+    """Save a BGR image (or crop) as JPEG, via libjpeg-turbo when available."""
+    if TURBOJPEG_AVAILABLE:
+        jpeg = _turbo.encode(np.ascontiguousarray(image), quality=quality,
+                             jpeg_subsample=TJSAMP_420)
+        with open(path, "wb") as f:
+            f.write(jpeg)
+    else:
+        cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+
+
+def frame_fingerprint(frame: np.ndarray) -> bytes:
+    """Fingerprint a frame so near-identical frames share a cache entry."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    thumb = cv2.resize(gray, (16, 16), interpolation=cv2.INTER_AREA)
+    return (thumb >> 4).tobytes()
 
 
 class FaceIdentity:
     """Represents a known person's face data."""
 
+    # Encodings kept per identity; the average still covers every sample
+    RESERVOIR_SIZE = 8
+
     def __init__(self, name: str, role: str = "unknown"):
         self.id = str(uuid.uuid4())[:8]
         self.name = name
         self.role = role  # owner, family, friend, known, unknown
-        self.encodings: List[np.ndarray] = []
+        # Uniform sample of the encodings seen (Algorithm R)
+        self.reservoir: List[np.ndarray] = []
+        self.num_encodings = 0
         self.photos: List[str] = []
-        self.first_seen = datetime.now().isoformat()
-        self.last_seen = datetime.now().isoformat()
+        self.first_seen = self.last_seen = datetime.now().isoformat()
         self.seen_count = 0
         self.avg_encoding: Optional[np.ndarray] = None
-
-    def add_encoding(self, encoding: np.ndarray, photo_path: str = None):
-        self.encodings.append(encoding)
+        # Running sum of encodings, so the average is O(1) to update
+        self._sum = np.zeros(ENCODING_DIM)
+        # Reservoir slots changed since the last save
+        self._unsaved: Set[int] = set()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "encodings" not in state:
+            return
+        # Legacy pickle: every encoding in a list
+        encodings = self.__dict__.pop("encodings")
+        self.num_encodings = len(encodings)
+        self._sum = np.sum(encodings, axis=0, dtype=np.float64) \
+            if encodings else np.zeros(ENCODING_DIM)
+        sample = random.sample(range(len(encodings)), min(len(encodings), self.RESERVOIR_SIZE))
+        self.reservoir = [np.asarray(encodings[i], dtype=np.float32) for i in sorted(sample)]
+        self._unsaved = set(range(len(self.reservoir)))
+
+    def touch(self, now: str):
+        """Record a sighting at ISO time ``now``."""
+        self.seen_count += 1
+        self.last_seen = now
+
+    def add_encoding(self, encoding: np.ndarray, photo_path: str = None, now: str = None):
+        encoding = np.asarray(encoding, dtype=np.float32)
+        self.num_encodings += 1
+        if len(self.reservoir) < self.RESERVOIR_SIZE:
+            self._unsaved.add(len(self.reservoir))
+            self.reservoir.append(encoding)
+        else:
+            slot = random.randrange(self.num_encodings)
+            if slot < self.RESERVOIR_SIZE:
+                self._unsaved.add(slot)
+                self.reservoir[slot] = encoding
         if photo_path:
             self.photos.append(photo_path)
-        self.seen_count += 1
-        self.last_seen = datetime.now().isoformat()
+        self.touch(now or datetime.now().isoformat())
         # Update average encoding for better matching
-        if len(self.encodings) > 1:
-            self.avg_encoding = np.mean(self.encodings, axis=0)
-        else:
-            self.avg_encoding = encoding
+        self._sum += encoding
+        self.avg_encoding = (self._sum / self.num_encodings).astype(np.float32)
+
+    def to_record(self, rows: List[int]) -> Dict:
+        """Everything but the reservoir, whose slots live at ``rows`` of the
+        encodings file."""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "role": self.role,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "seen_count": self.seen_count,
+            "photos": self.photos,
+            "has_avg": self.avg_encoding is not None,
+            "num_encodings": self.num_encodings,
+            "sum": self._sum.tolist(),
+            "rows": rows,
+        }
+
+    @classmethod
+    def from_record(cls, record: Dict, encodings: np.ndarray) -> "FaceIdentity":
+        identity = cls(record["name"], record["role"])
+        identity.id = record["id"]
+        identity.first_seen = record["first_seen"]
+        identity.last_seen = record["last_seen"]
+        identity.seen_count = record["seen_count"]
+        identity.photos = record["photos"]
+        identity.reservoir = [encodings[i] for i in record["rows"]]
+        identity.num_encodings = record["num_encodings"]
+        identity._sum = np.asarray(record["sum"], dtype=np.float64)
+        if record["has_avg"] and identity.num_encodings:
+            identity.avg_encoding = (identity._sum / identity.num_encodings).astype(np.float32)
+        return identity
 
     def to_dict(self):
         return {
@@ -61,7 +178,7 @@ class FaceIdentity:
             "first_seen": self.first_seen,
             "last_seen": self.last_seen,
             "seen_count": self.seen_count,
-            "num_encodings": len(self.encodings),
+            "num_encodings": self.num_encodings,
             "photos": self.photos[-5:]  # Last 5 photos
         }
 
@@ -69,55 +186,195 @@ class FaceIdentity:
 class FaceRecognitionService:
     """Manages face detection, recognition, and enrollment."""
 
+    # (is_owner, is_known) -> (box color, label format over the result dict)
+    DRAW_STYLES = {
+        (True, True): ((0, 255, 0), "{name} (Owner)"),  # Green for owner
+        (False, True): ((255, 165, 0), "{name} ({role})"),  # Orange for known
+        (False, False): ((0, 0, 255), "UNKNOWN ({confidence:.0%})"),  # Red for unknown
+    }
+    RESULT_CACHE_SIZE = 4
+
     def __init__(self):
         self.known_faces: Dict[str, FaceIdentity] = {}
         self.owner_id: Optional[str] = None
         self.face_cascade = None
+        self._cpu_pool: Optional[ProcessPoolExecutor] = None
+        self._use_cuda = settings.FACE_USE_CUDA and DLIB_USE_CUDA
+        if settings.FACE_USE_CUDA and not DLIB_USE_CUDA:
+            logger.warning("FACE_USE_CUDA is set but dlib has no CUDA support; detecting on the CPU")
+        self._model = "cnn" if self._use_cuda else settings.FACE_RECOGNITION_MODEL
+        if FACE_REC_AVAILABLE:
+            self._check_dlib_build()
+        # Matching gallery as parallel arrays: a float32 row per reference
+        # encoding, its squared norm, and the index into _gallery_faces of the
+        # identity it belongs to. The arrays are grown by doubling; the first
+        # _gallery_size entries are live. None means stale; rebuilt on next match.
+        # Enrollment updates it from worker threads while matching reads it,
+        # so both hold _gallery_lock.
+        self._gallery_lock = threading.Lock()
+        self._gallery: Optional[np.ndarray] = None
+        self._gallery_sqnorm: Optional[np.ndarray] = None
+        self._gallery_owner: Optional[np.ndarray] = None
+        self._gallery_size = 0
+        self._gallery_faces: List[FaceIdentity] = []
+        # identity id -> its row, for identities matched by average encoding
+        self._gallery_rows: Dict[str, int] = {}
+        # ids of identities matched by their reservoir instead
+        self._gallery_sampled: Set[str] = set()
+        # identity id -> rows of its encodings in the encodings file
+        self._stored_rows: Dict[str, List[int]] = {}
+        # Saves run on a writer thread; the one-slot queue coalesces bursts
+        # and the lock keeps enrollment from mutating faces mid-save.
+        self._db_lock = threading.Lock()
+        self._save_q: queue.Queue = queue.Queue(maxsize=1)
+        # frame fingerprint -> (monotonic time, results), most recent last
+        self._recent_results: "OrderedDict[bytes, Tuple[float, List[Dict]]]" = OrderedDict()
+        self._results_lock = threading.Lock()
         self._load_cascade()
         self._load_face_db()
+        threading.Thread(target=self._save_worker, daemon=True).start()
+        atexit.register(self._flush_face_db)
         logger.info(f"Face recognition service initialized. Known faces: {len(self.known_faces)}")
 
+    def _check_dlib_build(self):
+        """Log how dlib was compiled and avoid the CPU cnn detector without SIMD.
+
+        A dlib wheel built without USE_AVX_INSTRUCTIONS runs its HOG and
+        ResNet kernels scalar, several times slower; rebuild it from source
+        with ``python setup.py install --set USE_AVX_INSTRUCTIONS=1``.
+        """
+        avx = bool(getattr(dlib, "USE_AVX_INSTRUCTIONS", False))
+        logger.info(f"dlib {getattr(dlib, '__version__', '?')}: AVX={avx} "
+                    f"CUDA={DLIB_USE_CUDA} BLAS={getattr(dlib, 'DLIB_USE_BLAS', '?')}")
+        if avx or self._use_cuda or _cpu_has_avx() is False:
+            return
+        logger.warning("dlib was built without AVX on a CPU that supports it; "
+                       "face detection and encoding will be several times slower")
+        if self._model == "cnn":
+            logger.warning("Using the hog face detector: cnn without AVX or CUDA is too slow")
+            self._model = "hog"
+
     def _load_cascade(self):
         """Load OpenCV Haar cascade as fallback."""
         cascade_path = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
         self.face_cascade = cv2.CascadeClassifier(cascade_path)
 
     def _load_face_db(self):
-        """Load saved face database from disk."""
+        """Load saved face database from disk.
+
+        Encodings are a flat float32 file mapped read-only, so startup does
+        not unpickle them; the JSON index holds everything else. A legacy
+        pickle database is loaded once and rewritten in this format.
+        """
         db_path = os.path.join(settings.FACE_DB_DIR, "face_db.pkl")
-        meta_path = os.path.join(settings.FACE_DB_DIR, "face_meta.json")
+        index_path = os.path.join(settings.FACE_DB_DIR, "face_index.json")
+        enc_path = os.path.join(settings.FACE_DB_DIR, "face_encodings.f32")
 
-        if os.path.exists(db_path):
+        if os.path.exists(index_path):
+            try:
+                with open(index_path) as f:
+                    index = json.load(f)
+                rows = os.path.getsize(enc_path) // _ENCODING_BYTES if os.path.exists(enc_path) else 0
+                encodings = (np.memmap(enc_path, dtype=np.float32, mode="r", shape=(rows, ENCODING_DIM))
+                             if rows else np.empty((0, ENCODING_DIM), dtype=np.float32))
+                self.known_faces = {}
+                for record in index["faces"]:
+                    self.known_faces[record["id"]] = FaceIdentity.from_record(record, encodings)
+                    self._stored_rows[record["id"]] = list(record["rows"])
+                self.owner_id = index.get("owner_id")
+                self._gallery = None
+                logger.info(f"Loaded {len(self.known_faces)} faces from database")
+            except Exception as e:
+                logger.error(f"Failed to load face DB: {e}")
+        elif os.path.exists(db_path):
             try:
                 with open(db_path, "rb") as f:
                     data = pickle.load(f)
                     self.known_faces = data.get("faces", {})
                     self.owner_id = data.get("owner_id")
-                logger.info(f"Loaded {len(self.known_faces)} faces from database")
+                self._gallery = None
+                logger.info(f"Loaded {len(self.known_faces)} faces from legacy database")
+                self._save_face_db()
             except Exception as e:
                 logger.error(f"Failed to load face DB: {e}")
 
+    def _write_encodings(self, enc_path: str):
+        """Write reservoir slots changed since the last save.
+
+        A replaced slot is overwritten at its row; a new slot is appended.
+        """
+        new, changed = [], []
+        size = os.path.getsize(enc_path) if os.path.exists(enc_path) else 0
+        first = size // _ENCODING_BYTES
+        for face_id, identity in self.known_faces.items():
+            rows = self._stored_rows.setdefault(face_id, [])
+            for slot in sorted(identity._unsaved):
+                if slot < len(rows):
+                    changed.append((rows[slot], identity.reservoir[slot]))
+                else:
+                    rows.append(first + len(new))
+                    new.append(identity.reservoir[slot])
+            identity._unsaved.clear()
+        if not new and not changed:
+            return
+        with open(enc_path, "r+b" if size else "wb") as f:
+            for row, encoding in changed:
+                f.seek(row * _ENCODING_BYTES)
+                f.write(np.asarray(encoding, dtype=np.float32).tobytes())
+            if new:
+                # Also drops a partial row left by an interrupted write
+                f.truncate(first * _ENCODING_BYTES)
+                f.seek(first * _ENCODING_BYTES)
+                np.asarray(new, dtype=np.float32).tofile(f)
+
+    def _request_save(self):
+        """Queue a save for the writer thread; a save already queued covers it."""
+        try:
+            self._save_q.put_nowait(True)
+        except queue.Full:
+            pass
+
+    def _save_worker(self):
+        while self._save_q.get():
+            self._save_face_db()
+
+    def _flush_face_db(self):
+        """Run a queued save now instead of leaving it to the daemon writer."""
+        try:
+            self._save_q.get_nowait()
+        except queue.Empty:
+            with self._db_lock:  # wait out a save already in progress
+                return
+        self._save_face_db()
+
     def _save_face_db(self):
         """Persist face database to disk."""
-        db_path = os.path.join(settings.FACE_DB_DIR, "face_db.pkl")
+        index_path = os.path.join(settings.FACE_DB_DIR, "face_index.json")
+        enc_path = os.path.join(settings.FACE_DB_DIR, "face_encodings.f32")
         meta_path = os.path.join(settings.FACE_DB_DIR, "face_meta.json")
 
         try:
-            with open(db_path, "wb") as f:
-                pickle.dump({
-                    "faces": self.known_faces,
-                    "owner_id": self.owner_id
-                }, f)
-
-            # Save readable metadata
-            meta = {
-                "owner_id": self.owner_id,
-                "total_faces": len(self.known_faces),
-                "faces": {k: v.to_dict() for k, v in self.known_faces.items()},
-                "updated_at": datetime.now().isoformat()
-            }
-            with open(meta_path, "w") as f:
-                json.dump(meta, f, indent=2)
+            with self._db_lock:
+                # Rows first: the index must never point past the file
+                self._write_encodings(enc_path)
+                index = {
+                    "owner_id": self.owner_id,
+                    "faces": [v.to_record(self._stored_rows[k]) for k, v in self.known_faces.items()],
+                }
+                tmp_path = index_path + ".tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(index, f)
+                os.replace(tmp_path, index_path)
+
+                # Save readable metadata
+                meta = {
+                    "owner_id": self.owner_id,
+                    "total_faces": len(self.known_faces),
+                    "faces": {k: v.to_dict() for k, v in self.known_faces.items()},
+                    "updated_at": datetime.now().isoformat()
+                }
+                with open(meta_path, "w") as f:
+                    json.dump(meta, f, indent=2)
 
             logger.debug("Face database saved")
         except Exception as e:
@@ -126,17 +383,23 @@ class FaceRecognitionService:
     # ================================================================
     # Face Detection
     # ================================================================
-    def detect_faces(self, frame: np.ndarray) -> List[Tuple[int, int, int, int]]:
-        """Detect face locations in a frame. Returns list of (top, right, bottom, left)."""
+    def detect_faces(self, frame: np.ndarray,
+                     small: np.ndarray = None) -> List[Tuple[int, int, int, int]]:
+        """Detect face locations in a frame. Returns list of (top, right, bottom, left).
+
+        ``small`` may be a copy of ``frame`` already downscaled by
+        FACE_DETECTION_SCALE (e.g. from camera_service.get_frames()).
+        """
         if FACE_REC_AVAILABLE:
             # Downscale for speed
-            small = cv2.resize(frame, (0, 0),
-                             fx=settings.FACE_DETECTION_SCALE,
-                             fy=settings.FACE_DETECTION_SCALE)
+            if small is None:
+                small = cv2.resize(frame, (0, 0),
+                                 fx=settings.FACE_DETECTION_SCALE,
+                                 fy=settings.FACE_DETECTION_SCALE)
             rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
 
             locations = face_recognition.face_locations(
-                rgb_small, model=settings.FACE_RECOGNITION_MODEL
+                rgb_small, model=self._model
             )
 
             # Scale back up
@@ -166,8 +429,10 @@ class FaceRecognitionService:
     # ================================================================
     # Face Recognition
     # ================================================================
-    def recognize_faces(self, frame: np.ndarray) -> List[Dict]:
+    def recognize_faces(self, frame: np.ndarray, small: np.ndarray = None) -> List[Dict]:
         """Detect and identify faces in a frame.
+
+        ``small`` is an optional pre-downscaled copy, see detect_faces().
         
         Returns list of:
         {
@@ -176,23 +441,101 @@ class FaceRecognitionService:
             "is_owner": bool,
             "is_known": bool,
             "confidence": float,
-            "name": str
+            "name": str,
+            "role": str,
+            "too_small": bool  # under MIN_FACE_PIXELS, so never identified
         }
+
+        Results for a near-identical frame seen within FACE_RESULT_TTL are
+        returned again without detecting.
         """
-        locations = self.detect_faces(frame)
+        key = frame_fingerprint(frame if small is None else small)
+        results = self._cached_results(key)
+        if results is None:
+            results = self._recognize(frame, small)
+            self._cache_results(key, results)
+        return results
+
+    def _recognize(self, frame: np.ndarray, small: np.ndarray = None) -> List[Dict]:
+        locations, encodings = self._locate_and_encode(frame, small, settings.MIN_FACE_PIXELS)
         if not locations:
             return []
+        return self._match_faces(locations, encodings)
+
+    def _cached_results(self, key: bytes) -> Optional[List[Dict]]:
+        with self._results_lock:
+            entry = self._recent_results.get(key)
+        if entry is not None and time.monotonic() - entry[0] <= settings.FACE_RESULT_TTL:
+            return entry[1]
+        return None
+
+    def _cache_results(self, key: bytes, results: List[Dict]):
+        with self._results_lock:
+            self._recent_results[key] = (time.monotonic(), results)
+            self._recent_results.move_to_end(key)
+            if len(self._recent_results) > self.RESULT_CACHE_SIZE:
+                self._recent_results.popitem(last=False)
+
+    def _locate_and_encode(self, frame: np.ndarray, small: np.ndarray = None,
+                           min_pixels: int = 0) -> Tuple[List[Tuple], List[Optional[np.ndarray]]]:
+        """detect_faces() plus get_face_encodings() with one RGB conversion."""
+        if not FACE_REC_AVAILABLE:
+            return self.detect_faces(frame, small), []
+        return detect_and_encode(frame, small, settings.FACE_DETECTION_SCALE,
+                                 self._model, min_pixels)
+
+    async def recognize_faces_async(self, frame: np.ndarray,
+                                    small: np.ndarray = None) -> List[Dict]:
+        """recognize_faces() without blocking the event loop.
+
+        Detection and encoding run in a worker process so they use another
+        core instead of holding the GIL; matching against the known faces
+        stays in this process, on a thread, since the first match compiles
+        the numba kernel. On the GPU detection runs in a thread as well: a
+        CUDA context does not survive fork, and each worker would load its
+        own copy of the models onto the device.
+        """
+        key = frame_fingerprint(frame if small is None else small)
+        results = self._cached_results(key)
+        if results is not None:
+            return results
 
-        encodings = self.get_face_encodings(frame, locations)
+        if not FACE_REC_AVAILABLE or self._use_cuda:
+            results = await asyncio.to_thread(self._recognize, frame, small)
+        else:
+            if self._cpu_pool is None:
+                # Not fork: this process already runs the MQTT, camera and
+                # save threads, whose locks a forked child could inherit held.
+                # forkserver is POSIX-only; spawn elsewhere. Workers only
+                # import jarvis.face_worker, never the services package.
+                if "forkserver" in multiprocessing.get_all_start_methods():
+                    ctx = multiprocessing.get_context("forkserver")
+                    ctx.set_forkserver_preload(["jarvis.face_worker"])
+                else:
+                    ctx = multiprocessing.get_context("spawn")
+                self._cpu_pool = ProcessPoolExecutor(
+                    max_workers=max(1, (os.cpu_count() or 2) - 1), mp_context=ctx)
+
+            loop = asyncio.get_running_loop()
+            locations, encodings = await loop.run_in_executor(
+                self._cpu_pool, detect_and_encode, frame, small,
+                settings.FACE_DETECTION_SCALE, self._model, settings.MIN_FACE_PIXELS)
+            results = (await asyncio.to_thread(self._match_faces, locations, encodings)
+                       if locations else [])
+        self._cache_results(key, results)
+        return results
+
+    def _match_faces(self, locations: List[Tuple],
+                     encodings: List[Optional[np.ndarray]]) -> List[Dict]:
         results = []
+        now = datetime.now().isoformat()  # one timestamp for the whole frame
+        matches = iter(self._find_matches([e for e in encodings if e is not None]))
 
         for location, encoding in zip(locations, encodings):
-            match = self._find_match(encoding)
-
+            match = next(matches) if encoding is not None else None
             if match:
                 identity, distance = match
-                identity.last_seen = datetime.now().isoformat()
-                identity.seen_count += 1
+                identity.touch(now)
 
                 results.append({
                     "identity": identity,
@@ -201,7 +544,8 @@ class FaceRecognitionService:
                     "is_known": True,
                     "confidence": round(1.0 - distance, 3),
                     "name": identity.name,
-                    "role": identity.role
+                    "role": identity.role,
+                    "too_small": False
                 })
             else:
                 results.append({
@@ -211,39 +555,111 @@ class FaceRecognitionService:
                     "is_known": False,
                     "confidence": 0.0,
                     "name": "Unknown",
-                    "role": "unknown"
+                    "role": "unknown",
+                    "too_small": encoding is None
                 })
 
         return results
 
+    def _get_gallery(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the live (N, 128) encodings, their squared norms, and the
+        owner index of each row. Call with _gallery_lock held."""
+        if self._gallery is None:
+            rows, owners, avg_rows, sampled = [], [], {}, set()
+            self._gallery_faces = list(self.known_faces.values())
+            for owner, identity in enumerate(self._gallery_faces):
+                if identity.avg_encoding is not None:
+                    # Compare against average encoding (more stable)
+                    avg_rows[identity.id] = len(rows)
+                    refs = [identity.avg_encoding]
+                else:
+                    # Compare against the sampled encodings
+                    sampled.add(identity.id)
+                    refs = identity.reservoir
+                rows.extend(refs)
+                owners.extend([owner] * len(refs))
+            size = len(rows)
+            self._alloc_gallery(max(16, 2 * size))
+            self._gallery[:size] = np.asarray(rows, dtype=np.float32).reshape(-1, ENCODING_DIM)
+            self._gallery_sqnorm[:size] = np.einsum("ij,ij->i", self._gallery[:size], self._gallery[:size])
+            self._gallery_owner[:size] = owners
+            self._gallery_size = size
+            self._gallery_rows = avg_rows
+            self._gallery_sampled = sampled
+        size = self._gallery_size
+        return self._gallery[:size], self._gallery_sqnorm[:size], self._gallery_owner[:size]
+
+    def _alloc_gallery(self, capacity: int):
+        """(Re)allocate the gallery arrays, keeping the live rows."""
+        size = self._gallery_size if self._gallery is not None else 0
+        gallery = np.empty((capacity, ENCODING_DIM), dtype=np.float32)
+        sqnorm = np.empty(capacity, dtype=np.float32)
+        owner = np.empty(capacity, dtype=np.int32)
+        if size:
+            gallery[:size] = self._gallery[:size]
+            sqnorm[:size] = self._gallery_sqnorm[:size]
+            owner[:size] = self._gallery_owner[:size]
+        self._gallery, self._gallery_sqnorm, self._gallery_owner = gallery, sqnorm, owner
+
+    def _update_gallery(self, identity: FaceIdentity):
+        """Sync the gallery after ``identity`` gained an encoding.
+
+        Rewrites the identity's row in place, or appends one for a new
+        identity, instead of restacking every known face.
+        """
+        with self._results_lock:
+            self._recent_results.clear()
+        with self._gallery_lock:
+            self._update_gallery_rows(identity)
+
+    def _update_gallery_rows(self, identity: FaceIdentity):
+        if self._gallery is None:
+            return
+        row = self._gallery_rows.get(identity.id)
+        encoding = np.asarray(identity.avg_encoding, dtype=np.float32)
+        if row is None and identity.id in self._gallery_sampled:
+            # Was matched by its sampled encodings; rebuild once
+            self._gallery = None
+            return
+        if row is None:
+            row = self._gallery_size
+            if row == len(self._gallery):
+                self._alloc_gallery(2 * row)
+            self._gallery_owner[row] = len(self._gallery_faces)
+            self._gallery_faces.append(identity)
+            self._gallery_rows[identity.id] = row
+            self._gallery_size += 1
+        self._gallery[row] = encoding
+        self._gallery_sqnorm[row] = encoding @ encoding
+
     def _find_match(self, encoding: np.ndarray) -> Optional[Tuple[FaceIdentity, float]]:
         """Find the best matching known face for an encoding."""
-        if not FACE_REC_AVAILABLE or not self.known_faces:
-            return None
-
-        best_match = None
-        best_distance = settings.FACE_ENCODING_TOLERANCE
-
-        for identity in self.known_faces.values():
-            if identity.avg_encoding is not None:
-                # Compare against average encoding (more stable)
-                distance = face_recognition.face_distance(
-                    [identity.avg_encoding], encoding
-                )[0]
-            elif identity.encodings:
-                # Compare against all encodings
-                distances = face_recognition.face_distance(
-                    identity.encodings, encoding
-                )
-                distance = min(distances)
+        return self._find_matches([encoding])[0]
+
+    def _find_matches(self, encodings: List[np.ndarray]) -> List[Optional[Tuple[FaceIdentity, float]]]:
+        """Find the best matching known face for each encoding of a frame."""
+        if not FACE_REC_AVAILABLE or not self.known_faces or not len(encodings):
+            return [None] * len(encodings)
+
+        queries = np.ascontiguousarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        with self._gallery_lock:
+            gallery, sqnorm, owner = self._get_gallery()
+            if not len(gallery):
+                return [None] * len(encodings)
+
+            if len(gallery) == 1:
+                # Owner-only setups: one reference, nothing to rank, and not
+                # worth a parallel kernel launch
+                best = np.zeros(len(queries), dtype=np.intp)
+                best_distances = np.linalg.norm(queries - gallery[0], axis=1)
             else:
-                continue
+                best, best_distances = nearest(gallery, sqnorm, queries)
+            owners = owner[best].tolist()
+            faces = self._gallery_faces
 
-            if distance < best_distance:
-                best_distance = distance
-                best_match = (identity, distance)
-
-        return best_match
+        tolerance = settings.FACE_ENCODING_TOLERANCE
+        return [(faces[i], float(d)) if d < tolerance else None
+                for i, d in zip(owners, best_distances.tolist())]
 
     # ================================================================
     # Owner Enrollment
@@ -251,14 +667,13 @@ class FaceRecognitionService:
     def register_owner(self, frame: np.ndarray, name: str = None) -> Dict:
         """Register the owner's face from a frame."""
         name = name or settings.OWNER_NAME
-        locations = self.detect_faces(frame)
+        locations, encodings = self._locate_and_encode(frame)
 
         if not locations:
             return {"success": False, "error": "No face detected"}
         if len(locations) > 1:
             return {"success": False, "error": "Multiple faces detected. Please be alone."}
 
-        encodings = self.get_face_encodings(frame, locations)
         if not encodings:
             return {"success": False, "error": "Could not encode face"}
 
@@ -268,60 +683,63 @@ class FaceRecognitionService:
         )
         t, r, b, l = locations[0]
         face_img = frame[max(0, t-20):b+20, max(0, l-20):r+20]
-        cv2.imwrite(photo_path, face_img)
+        _write_jpeg(photo_path, face_img)
 
         # Create or update owner identity
-        if self.owner_id and self.owner_id in self.known_faces:
-            identity = self.known_faces[self.owner_id]
-            identity.add_encoding(encodings[0], photo_path)
-        else:
-            identity = FaceIdentity(name=name, role="owner")
-            identity.add_encoding(encodings[0], photo_path)
-            self.known_faces[identity.id] = identity
-            self.owner_id = identity.id
+        with self._db_lock:
+            if self.owner_id and self.owner_id in self.known_faces:
+                identity = self.known_faces[self.owner_id]
+                identity.add_encoding(encodings[0], photo_path)
+            else:
+                identity = FaceIdentity(name=name, role="owner")
+                identity.add_encoding(encodings[0], photo_path)
+                self.known_faces[identity.id] = identity
+                self.owner_id = identity.id
 
-        self._save_face_db()
+        self._update_gallery(identity)
+        self._request_save()
 
         return {
             "success": True,
             "owner_id": self.owner_id,
             "name": name,
-            "total_samples": len(identity.encodings),
-            "needed": max(0, settings.FACE_REGISTRATION_SAMPLES - len(identity.encodings)),
+            "total_samples": identity.num_encodings,
+            "needed": max(0, settings.FACE_REGISTRATION_SAMPLES - identity.num_encodings),
             "photo": photo_path
         }
 
     def register_known_person(self, frame: np.ndarray, name: str,
                                role: str = "known") -> Dict:
         """Register a known person (family, friend, etc.)."""
-        locations = self.detect_faces(frame)
+        locations, encodings = self._locate_and_encode(frame)
         if not locations:
             return {"success": False, "error": "No face detected"}
 
-        encodings = self.get_face_encodings(frame, locations)
         if not encodings:
             return {"success": False, "error": "Could not encode face"}
 
         # Check if already known
         match = self._find_match(encodings[0])
-        if match:
-            identity, _ = match
-            identity.add_encoding(encodings[0])
-            identity.name = name
-            identity.role = role
-        else:
-            identity = FaceIdentity(name=name, role=role)
-            identity.add_encoding(encodings[0])
-            self.known_faces[identity.id] = identity
+        with self._db_lock:
+            if match:
+                identity, _ = match
+                identity.add_encoding(encodings[0])
+                identity.name = name
+                identity.role = role
+            else:
+                identity = FaceIdentity(name=name, role=role)
+                identity.add_encoding(encodings[0])
+                self.known_faces[identity.id] = identity
 
-        self._save_face_db()
+        self._update_gallery(identity)
+        self._request_save()
 
         return {
             "success": True,
             "person_id": identity.id,
             "name": name,
             "role": role,
-            "total_samples": len(identity.encodings)
+            "total_samples": identity.num_encodings
         }
 
     # ================================================================
@@ -335,28 +753,31 @@ class FaceRecognitionService:
         filepath = os.path.join(settings.INTRUDER_DIR, filename)
 
         # Save full frame
-        cv2.imwrite(filepath, frame)
+        _write_jpeg(filepath, frame)
 
         # Save cropped face
         t, r, b, l = location
         face_img = frame[max(0, t-30):b+30, max(0, l-30):r+30]
         face_path = os.path.join(settings.INTRUDER_DIR, f"face_{filename}")
-        cv2.imwrite(face_path, face_img)
+        _write_jpeg(face_path, face_img)
 
-        # Get encoding for future matching
-        encodings = self.get_face_encodings(frame, [location])
+        # Get encoding for future matching; a too-small face only gets photos
+        encodings = encode_faces(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), [location],
+                                  settings.MIN_FACE_PIXELS) if FACE_REC_AVAILABLE else []
 
         # Auto-register as unknown person
-        if encodings:
+        if encodings and encodings[0] is not None:
             match = self._find_match(encodings[0])
-            if match:
-                identity, _ = match
-                identity.add_encoding(encodings[0], filepath)
-            else:
-                identity = FaceIdentity(name=f"Unknown_{timestamp[:8]}", role="unknown")
-                identity.add_encoding(encodings[0], filepath)
-                self.known_faces[identity.id] = identity
-            self._save_face_db()
+            with self._db_lock:
+                if match:
+                    identity, _ = match
+                    identity.add_encoding(encodings[0], filepath)
+                else:
+                    identity = FaceIdentity(name=f"Unknown_{timestamp[:8]}", role="unknown")
+                    identity.add_encoding(encodings[0], filepath)
+                    self.known_faces[identity.id] = identity
+            self._update_gallery(identity)
+            self._request_save()
 
         # Cleanup old intruder photos
         self._cleanup_intruder_photos()
@@ -370,30 +791,34 @@ class FaceRecognitionService:
 
     def _cleanup_intruder_photos(self):
         """Keep only the most recent intruder photos."""
-        files = sorted(Path(settings.INTRUDER_DIR).glob("intruder_*.jpg"))
-        if len(files) > settings.MAX_INTRUDER_PHOTOS:
-            for f in files[:-settings.MAX_INTRUDER_PHOTOS]:
-                f.unlink(missing_ok=True)
+        # Names embed the capture time, so name order is age order: one
+        # directory pass without stat calls, then select just the overflow
+        with os.scandir(settings.INTRUDER_DIR) as entries:
+            names = [e.name for e in entries
+                     if e.name.startswith("intruder_") and e.name.endswith(".jpg")]
+        excess = len(names) - settings.MAX_INTRUDER_PHOTOS
+        if excess > 0:
+            for name in heapq.nsmallest(excess, names):
+                Path(settings.INTRUDER_DIR, name).unlink(missing_ok=True)
 
     # ================================================================
     # Utilities
     # ================================================================
     def draw_faces(self, frame: np.ndarray, results: List[Dict]) -> np.ndarray:
-        """Draw face bounding boxes and labels on frame."""
+        """Draw face bounding boxes and labels on frame.
+
+        With no results there is nothing to draw and ``frame`` itself is
+        returned, uncopied.
+        """
+        if not results:
+            return frame
         annotated = frame.copy()
+        styles = self.DRAW_STYLES
 
         for r in results:
             t, right, b, l = r["location"]
-
-            if r["is_owner"]:
-                color = (0, 255, 0)  # Green for owner
-                label = f"{r['name']} (Owner)"
-            elif r["is_known"]:
-                color = (255, 165, 0)  # Orange for known
-                label = f"{r['name']} ({r['role']})"
-            else:
-                color = (0, 0, 255)  # Red for unknown
-                label = f"UNKNOWN ({r['confidence']:.0%})"
+            color, label = styles[r["is_owner"], r["is_known"]]
+            label = label.format_map(r)
 
             cv2.rectangle(annotated, (l, t), (right, b), color, 2)
             cv2.putText(annotated, label, (l, t - 10),
@@ -411,11 +836,18 @@ class FaceRecognitionService:
         """Get all known faces."""
         return [f.to_dict() for f in self.known_faces.values()]
 
+    def shutdown(self):
+        """Write any pending save and stop the recognition worker processes."""
+        self._flush_face_db()
+        if self._cpu_pool is not None:
+            self._cpu_pool.shutdown(wait=False, cancel_futures=True)
+            self._cpu_pool = None
+
     def is_owner_registered(self) -> bool:
         """Check if the owner's face is registered."""
         return (self.owner_id is not None and
                 self.owner_id in self.known_faces and
-                len(self.known_faces[self.owner_id].encodings) > 0)
+                self.known_faces[self.owner_id].num_encodings > 0)
 
 
 # Singleton
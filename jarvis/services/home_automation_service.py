@@ -7,15 +7,59 @@ Integrates with MQTT bridge and ESP32 manager services.
 """
 import asyncio
 import json
+import re
 import time
 from datetime import datetime
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Set
 
 import httpx
 from loguru import logger
 
 from jarvis.config import settings
 
+# A sensor reading is reused for this long; the DHT on the board cannot
+# sample faster than about once a second anyway
+SENSOR_CACHE_TTL = 2.0  # seconds
+
+# Keyword groups for process_command(); a branch fires when any of its
+# words occurs in the command
+_ALL_ON_WORDS = frozenset({"all lights on", "turn on everything", "all on"})
+_ALL_OFF_WORDS = frozenset({"all lights off", "turn off everything", "all off"})
+_DOOR_WORDS = frozenset({"door status", "is the door", "door open", "door closed"})
+_LOCK_WORDS = frozenset({"lock the door", "lock door", "lock up", "engage lock"})
+_UNLOCK_WORDS = frozenset({"unlock the door", "unlock door", "unlock", "disengage lock"})
+_PHOTO_WORDS = frozenset({"take a photo", "capture image", "take picture", "snapshot"})
+_CAMERA_WORDS = frozenset({"camera status", "cam status"})
+_SCHEDULE_WORDS = frozenset({"show schedules", "list schedules", "what schedules"})
+_HEARTBEAT_WORDS = frozenset({"system status", "heartbeat", "device health"})
+_ON_WORDS = frozenset({"on", "turn on", "switch on", "enable"})
+_OFF_WORDS = frozenset({"off", "turn off", "switch off", "disable"})
+_TEMPERATURE_WORDS = frozenset({"temperature", "temp", "how hot", "how cold"})
+_POWER_WORDS = frozenset({"voltage", "current", "power", "electricity"})
+_STATUS_WORDS = frozenset({"status", "devices", "what's on"})
+_BUZZER_WORDS = frozenset({"alarm", "alert", "buzz", "beep"})
+_RELAY_WORDS = {i: frozenset({f"relay {i}", f"switch {i}", f"light {i}"}) for i in range(1, 9)}
+
+# One scan finds every keyword occurrence (the lookahead lets matches
+# overlap). Only the longest keyword at a position is reported, so each
+# keyword also stands for the keywords it contains ("turn on" -> "on").
+_KEYWORDS = frozenset().union(
+    _ALL_ON_WORDS, _ALL_OFF_WORDS, _DOOR_WORDS, _LOCK_WORDS, _UNLOCK_WORDS,
+    _PHOTO_WORDS, _CAMERA_WORDS, _SCHEDULE_WORDS, _HEARTBEAT_WORDS, _ON_WORDS,
+    _OFF_WORDS, _TEMPERATURE_WORDS, _POWER_WORDS, _STATUS_WORDS, _BUZZER_WORDS,
+    *_RELAY_WORDS.values())
+_KEYWORD_RE = re.compile(
+    "(?=(" + "|".join(map(re.escape, sorted(_KEYWORDS, key=len, reverse=True))) + "))")
+_IMPLIED = {kw: frozenset(k for k in _KEYWORDS if k in kw) for kw in _KEYWORDS}
+
+
+def _keywords_in(command: str) -> Set[str]:
+    """Every keyword that occurs in ``command``."""
+    found = set()
+    for kw in set(_KEYWORD_RE.findall(command)):
+        found |= _IMPLIED[kw]
+    return found
+
 
 class HomeAutomationService:
     """Controls smart home devices via ESP32 server and camera."""
@@ -36,6 +80,9 @@ class HomeAutomationService:
         ]
         self._mqtt_bridge = None
         self._esp32_manager = None
+        # One pooled client per board, so calls reuse kept-alive connections
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cam_client: Optional[httpx.AsyncClient] = None
         logger.info(f"Home automation service v3.0 initialized. ESP32: {settings.ESP32_SERVER_URL}")
 
     def set_mqtt_bridge(self, bridge):
@@ -48,21 +95,48 @@ class HomeAutomationService:
         self._esp32_manager = manager
         logger.info("ESP32 manager linked to home automation service")
 
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared client for the ESP32 server API."""
+        if self._client is None or self._client.is_closed:
+            self._client = self._new_client(self.base_url)
+        return self._client
+
+    def _get_cam_client(self) -> httpx.AsyncClient:
+        """Return the shared client for the ESP32-CAM."""
+        if self._cam_client is None or self._cam_client.is_closed:
+            self._cam_client = self._new_client(self.cam_url)
+        return self._cam_client
+
+    @staticmethod
+    def _new_client(base_url: str) -> httpx.AsyncClient:
+        # Idle connections outlive the default 5 s so 10-30 s sensor and
+        # heartbeat polls land on a warm socket
+        return httpx.AsyncClient(base_url=base_url, timeout=httpx.Timeout(5.0),
+                                 limits=httpx.Limits(max_keepalive_connections=20,
+                                                     max_connections=100,
+                                                     keepalive_expiry=30.0))
+
+    async def close(self):
+        """Close the shared HTTP clients."""
+        for client in (self._client, self._cam_client):
+            if client is not None and not client.is_closed:
+                await client.aclose()
+        self._client = self._cam_client = None
+
     # ================================================================
     # Relay / Switch Control
     # ================================================================
     async def set_relay(self, relay: int, state: bool) -> Dict:
         """Turn a relay on/off."""
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.post(
-                    f"{self.base_url}/gpio/relay",
-                    params={"relay": relay, "state": 1 if state else 0}
-                )
-                result = resp.json()
-                self._device_states[f"relay_{relay}"] = state
-                logger.info(f"Relay {relay}: {'ON' if state else 'OFF'}")
-                return result
+            resp = await self._get_client().post(
+                "/gpio/relay",
+                params={"relay": relay, "state": 1 if state else 0}
+            )
+            result = resp.json()
+            self._device_states[f"relay_{relay}"] = state
+            logger.info(f"Relay {relay}: {'ON' if state else 'OFF'}")
+            return result
         except Exception as e:
             logger.error(f"Set relay failed: {e}")
             return {"error": str(e)}
@@ -70,27 +144,53 @@ class HomeAutomationService:
     async def set_relay_by_room(self, room: str, state: bool) -> Dict:
         """Control a relay by room name."""
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.post(
-                    f"{self.base_url}/gpio/relay/room",
-                    params={"room": room, "state": 1 if state else 0}
-                )
-                result = resp.json()
-                logger.info(f"Room '{room}': {'ON' if state else 'OFF'}")
-                return result
+            resp = await self._get_client().post(
+                "/gpio/relay/room",
+                params={"room": room, "state": 1 if state else 0}
+            )
+            result = resp.json()
+            logger.info(f"Room '{room}': {'ON' if state else 'OFF'}")
+            return result
         except Exception as e:
             logger.error(f"Set room relay failed: {e}")
             return {"error": str(e)}
 
+    async def set_rooms(self, rooms: List[str], state: bool) -> List[Dict]:
+        """Control several rooms at once; the requests run concurrently."""
+        return await asyncio.gather(*(self.set_relay_by_room(r, state) for r in rooms))
+
+    async def set_relays_batch(self, updates: Dict[int, bool]) -> Dict:
+        """Set several relays in one request.
+
+        Firmware without the batch route gets one request per relay instead.
+        """
+        if len(updates) == 1:
+            return await self.set_relay(*next(iter(updates.items())))
+        try:
+            resp = await self._get_client().post(
+                "/gpio/relay/batch",
+                params={"states": ",".join(f"{r}:{1 if s else 0}" for r, s in updates.items())}
+            )
+            if resp.status_code == 404:
+                results = await asyncio.gather(*(self.set_relay(r, s) for r, s in updates.items()))
+                return {"relays_set": sum("error" not in r for r in results)}
+            result = resp.json()
+            for relay, state in updates.items():
+                self._device_states[f"relay_{relay}"] = state
+            logger.info(f"Relays set: {updates}")
+            return result
+        except Exception as e:
+            logger.error(f"Set relays failed: {e}")
+            return {"error": str(e)}
+
     async def set_all_relays(self, state: bool) -> Dict:
         """Turn all relays on/off."""
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.post(
-                    f"{self.base_url}/gpio/relay/all",
-                    params={"state": 1 if state else 0}
-                )
-                return resp.json()
+            resp = await self._get_client().post(
+                "/gpio/relay/all",
+                params={"state": 1 if state else 0}
+            )
+            return resp.json()
         except Exception as e:
             logger.error(f"Set all relays failed: {e}")
             return {"error": str(e)}
@@ -98,10 +198,9 @@ class HomeAutomationService:
     async def get_relay_status(self) -> Dict:
         """Get current status of all relays."""
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.get(f"{self.base_url}/gpio/status")
-                self._device_states = resp.json()
-                return self._device_states
+            resp = await self._get_client().get("/gpio/status")
+            self._device_states = resp.json()
+            return self._device_states
         except Exception as e:
             logger.error(f"Get relay status failed: {e}")
             return {"error": str(e)}
@@ -112,38 +211,42 @@ class HomeAutomationService:
     async def save_scene(self, scene_id: int) -> Dict:
         """Save current relay states as a scene."""
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.post(
-                    f"{self.base_url}/gpio/scene/save",
-                    params={"scene": scene_id}
-                )
-                return resp.json()
+            resp = await self._get_client().post(
+                "/gpio/scene/save",
+                params={"scene": scene_id}
+            )
+            return resp.json()
         except Exception as e:
             return {"error": str(e)}
 
     async def load_scene(self, scene_id: int) -> Dict:
         """Load a saved scene."""
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.post(
-                    f"{self.base_url}/gpio/scene/load",
-                    params={"scene": scene_id}
-                )
-                return resp.json()
+            resp = await self._get_client().post(
+                "/gpio/scene/load",
+                params={"scene": scene_id}
+            )
+            return resp.json()
         except Exception as e:
             return {"error": str(e)}
 
     # ================================================================
     # Sensor Data
     # ================================================================
-    async def get_sensors(self) -> Dict:
-        """Read all sensor data from ESP32."""
+    async def get_sensors(self, force: bool = False) -> Dict:
+        """Read all sensor data from ESP32.
+
+        A reading younger than SENSOR_CACHE_TTL is returned without a
+        request unless ``force`` is set.
+        """
+        if (not force and self._sensor_data
+                and time.time() - self._last_sensor_read < SENSOR_CACHE_TTL):
+            return self._sensor_data
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.get(f"{self.base_url}/sensors")
-                self._sensor_data = resp.json()
-                self._last_sensor_read = time.time()
-                return self._sensor_data
+            resp = await self._get_client().get("/sensors")
+            self._sensor_data = resp.json()
+            self._last_sensor_read = time.time()
+            return self._sensor_data
         except Exception as e:
             logger.error(f"Get sensors failed: {e}")
             return {"error": str(e)}
@@ -159,9 +262,8 @@ class HomeAutomationService:
     async def get_power_data(self) -> Dict:
         """Get voltage/current/power readings."""
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.get(f"{self.base_url}/sensors/power")
-                return resp.json()
+            resp = await self._get_client().get("/sensors/power")
+            return resp.json()
         except Exception as e:
             return {"error": str(e)}
 
@@ -171,12 +273,11 @@ class HomeAutomationService:
     async def buzz(self, pattern: str = "alert") -> Dict:
         """Trigger buzzer pattern on ESP32."""
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.post(
-                    f"{self.base_url}/gpio/buzzer",
-                    params={"pattern": pattern}
-                )
-                return resp.json()
+            resp = await self._get_client().post(
+                "/gpio/buzzer",
+                params={"pattern": pattern}
+            )
+            return resp.json()
         except Exception as e:
             return {"error": str(e)}
 
@@ -186,12 +287,11 @@ class HomeAutomationService:
     async def get_door_status(self) -> Dict:
         """Get door sensor and lock status."""
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.get(f"{self.base_url}/door/status")
-                data = resp.json()
-                self._door_state = data.get("door", "unknown")
-                self._lock_state = data.get("lock", "unknown")
-                return data
+            resp = await self._get_client().get("/door/status")
+            data = resp.json()
+            self._door_state = data.get("door", "unknown")
+            self._lock_state = data.get("lock", "unknown")
+            return data
         except Exception as e:
             logger.error(f"Get door status failed: {e}")
             return {"error": str(e)}
@@ -208,15 +308,14 @@ class HomeAutomationService:
     async def set_lock(self, locked: bool) -> Dict:
         """Lock or unlock the door."""
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.post(
-                    f"{self.base_url}/lock/set",
-                    params={"state": "1" if locked else "0"}
-                )
-                result = resp.json()
-                self._lock_state = "locked" if locked else "unlocked"
-                logger.info(f"Lock: {'LOCKED' if locked else 'UNLOCKED'}")
-                return result
+            resp = await self._get_client().post(
+                "/lock/set",
+                params={"state": "1" if locked else "0"}
+            )
+            result = resp.json()
+            self._lock_state = "locked" if locked else "unlocked"
+            logger.info(f"Lock: {'LOCKED' if locked else 'UNLOCKED'}")
+            return result
         except Exception as e:
             logger.error(f"Set lock failed: {e}")
             return {"error": str(e)}
@@ -224,11 +323,10 @@ class HomeAutomationService:
     async def toggle_lock(self) -> Dict:
         """Toggle lock state."""
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.post(f"{self.base_url}/lock/toggle")
-                result = resp.json()
-                self._lock_state = result.get("lock", "unknown")
-                return result
+            resp = await self._get_client().post("/lock/toggle")
+            result = resp.json()
+            self._lock_state = result.get("lock", "unknown")
+            return result
         except Exception as e:
             return {"error": str(e)}
 
@@ -238,11 +336,10 @@ class HomeAutomationService:
     async def get_schedules(self) -> List[Dict]:
         """Get all active schedules."""
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.get(f"{self.base_url}/schedules")
-                data = resp.json()
-                self._schedules = data.get("schedules", [])
-                return self._schedules
+            resp = await self._get_client().get("/schedules")
+            data = resp.json()
+            self._schedules = data.get("schedules", [])
+            return self._schedules
         except Exception as e:
             logger.error(f"Get schedules failed: {e}")
             return []
@@ -252,27 +349,25 @@ class HomeAutomationService:
                            repeat: int = 1) -> Dict:
         """Add a new automation schedule."""
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.post(
-                    f"{self.base_url}/schedules/add",
-                    params={
-                        "relay": relay, "hour": hour, "minute": minute,
-                        "action": action, "days": days, "repeat": repeat
-                    }
-                )
-                return resp.json()
+            resp = await self._get_client().post(
+                "/schedules/add",
+                params={
+                    "relay": relay, "hour": hour, "minute": minute,
+                    "action": action, "days": days, "repeat": repeat
+                }
+            )
+            return resp.json()
         except Exception as e:
             return {"error": str(e)}
 
     async def delete_schedule(self, schedule_id: int) -> Dict:
         """Delete a schedule."""
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.post(
-                    f"{self.base_url}/schedules/delete",
-                    params={"id": schedule_id}
-                )
-                return resp.json()
+            resp = await self._get_client().post(
+                "/schedules/delete",
+                params={"id": schedule_id}
+            )
+            return resp.json()
         except Exception as e:
             return {"error": str(e)}
 
@@ -282,9 +377,8 @@ class HomeAutomationService:
     async def get_camera_status(self) -> Dict:
         """Get ESP32-CAM status."""
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.get(f"{self.cam_url}/jarvis/status")
-                return resp.json()
+            resp = await self._get_cam_client().get("/jarvis/status")
+            return resp.json()
         except Exception as e:
             logger.error(f"Camera status failed: {e}")
             return {"error": str(e)}
@@ -292,10 +386,9 @@ class HomeAutomationService:
     async def camera_capture(self) -> Optional[bytes]:
         """Capture a JPEG image from the camera."""
         try:
-            async with httpx.AsyncClient(timeout=10) as client:
-                resp = await client.get(f"{self.cam_url}/capture")
-                if resp.status_code == 200:
-                    return resp.content
+            resp = await self._get_cam_client().get("/capture", timeout=10)
+            if resp.status_code == 200:
+                return resp.content
         except Exception as e:
             logger.error(f"Camera capture failed: {e}")
         return None
@@ -303,9 +396,8 @@ class HomeAutomationService:
     async def camera_detect(self) -> Dict:
         """Trigger AI detection on camera."""
         try:
-            async with httpx.AsyncClient(timeout=15) as client:
-                resp = await client.get(f"{self.cam_url}/jarvis/detect")
-                return resp.json()
+            resp = await self._get_cam_client().get("/jarvis/detect", timeout=15)
+            return resp.json()
         except Exception as e:
             return {"error": str(e)}
 
@@ -319,16 +411,28 @@ class HomeAutomationService:
     async def get_heartbeat(self) -> Dict:
         """Get full device heartbeat from ESP32 server."""
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.get(f"{self.base_url}/jarvis/heartbeat")
-                self._last_heartbeat = resp.json()
-                return self._last_heartbeat
+            resp = await self._get_client().get("/jarvis/heartbeat")
+            self._last_heartbeat = resp.json()
+            return self._last_heartbeat
         except Exception as e:
             return {"error": str(e)}
 
     def get_cached_heartbeat(self) -> Dict:
         return self._last_heartbeat
 
+    async def get_full_status(self) -> Dict:
+        """Door, sensors, power, relays and heartbeat, fetched concurrently.
+
+        A part that fails is reported as {"error": ...} like the single
+        getters, so the result always serializes.
+        """
+        parts = ("door", "sensors", "power", "relays", "heartbeat")
+        results = await asyncio.gather(
+            self.get_door_status(), self.get_sensors(), self.get_power_data(),
+            self.get_relay_status(), self.get_heartbeat(), return_exceptions=True)
+        return {part: {"error": str(r)} if isinstance(r, BaseException) else r
+                for part, r in zip(parts, results)}
+
     # ================================================================
     # Natural Language Command Processing
     # ================================================================
@@ -339,40 +443,41 @@ class HomeAutomationService:
                   camera, sensors, scenes, buzzer, and more.
         """
         command = command.lower().strip()
+        found = _keywords_in(command)
 
         # ---- All lights/relays ----
-        if any(w in command for w in ["all lights on", "turn on everything", "all on"]):
+        if not found.isdisjoint(_ALL_ON_WORDS):
             await self.set_all_relays(True)
             return "All lights turned on."
 
-        if any(w in command for w in ["all lights off", "turn off everything", "all off"]):
+        if not found.isdisjoint(_ALL_OFF_WORDS):
             await self.set_all_relays(False)
             return "All lights turned off."
 
         # ---- Door ----
-        if any(w in command for w in ["door status", "is the door", "door open", "door closed"]):
+        if not found.isdisjoint(_DOOR_WORDS):
             data = await self.get_door_status()
             door = data.get("door", "unknown")
             lock = data.get("lock", "unknown")
             return f"The door is {door}. The lock is {lock}."
 
         # ---- Lock ----
-        if any(w in command for w in ["lock the door", "lock door", "lock up", "engage lock"]):
+        if not found.isdisjoint(_LOCK_WORDS):
             await self.set_lock(True)
             return "Door locked."
 
-        if any(w in command for w in ["unlock the door", "unlock door", "unlock", "disengage lock"]):
+        if not found.isdisjoint(_UNLOCK_WORDS):
             await self.set_lock(False)
             return "Door unlocked."
 
         # ---- Camera ----
-        if any(w in command for w in ["take a photo", "capture image", "take picture", "snapshot"]):
+        if not found.isdisjoint(_PHOTO_WORDS):
             result = await self.camera_detect()
             if "error" not in result:
                 return f"Image captured and processed. AI result: {json.dumps(result)[:200]}"
             return "Failed to capture image."
 
-        if any(w in command for w in ["camera status", "cam status"]):
+        if not found.isdisjoint(_CAMERA_WORDS):
             status = await self.get_camera_status()
             if "error" not in status:
                 streaming = status.get("streaming", False)
@@ -385,7 +490,7 @@ class HomeAutomationService:
             return f"Camera stream: {self.get_stream_url()}"
 
         # ---- Schedule ----
-        if any(w in command for w in ["show schedules", "list schedules", "what schedules"]):
+        if not found.isdisjoint(_SCHEDULE_WORDS):
             schedules = await self.get_schedules()
             if schedules:
                 lines = []
@@ -395,7 +500,7 @@ class HomeAutomationService:
             return "No schedules configured."
 
         # ---- Heartbeat / System ----
-        if any(w in command for w in ["system status", "heartbeat", "device health"]):
+        if not found.isdisjoint(_HEARTBEAT_WORDS):
             hb = await self.get_heartbeat()
             if "error" not in hb:
                 return (f"ESP32 Server: up {hb.get('uptime', 0)}s, "
@@ -408,36 +513,37 @@ class HomeAutomationService:
             return "Could not reach ESP32 server."
 
         # ---- Room-specific ----
-        for room in self._room_names:
-            room_lower = room.lower()
-            if room_lower in command:
-                if any(w in command for w in ["on", "turn on", "switch on", "enable"]):
-                    await self.set_relay_by_room(room, True)
-                    return f"{room} light turned on."
-                elif any(w in command for w in ["off", "turn off", "switch off", "disable"]):
-                    await self.set_relay_by_room(room, False)
-                    return f"{room} light turned off."
+        rooms = [room for room in self._room_names if room.lower() in command]
+        if rooms:
+            lights = f"{' and '.join(rooms)} light{'s' if len(rooms) > 1 else ''}"
+            if not found.isdisjoint(_ON_WORDS):
+                await self.set_rooms(rooms, True)
+                return f"{lights} turned on."
+            elif not found.isdisjoint(_OFF_WORDS):
+                await self.set_rooms(rooms, False)
+                return f"{lights} turned off."
 
         # ---- Numbered relay ----
-        for i in range(1, 9):
-            words = [f"relay {i}", f"switch {i}", f"light {i}"]
-            if any(w in command for w in words):
-                if any(w in command for w in ["on", "turn on", "enable"]):
-                    await self.set_relay(i, True)
-                    return f"Relay {i} turned on."
-                elif any(w in command for w in ["off", "turn off", "disable"]):
-                    await self.set_relay(i, False)
-                    return f"Relay {i} turned off."
+        relays = [i for i in range(1, 9)
+                  if not found.isdisjoint(_RELAY_WORDS[i])]
+        if relays:
+            label = f"Relay{'s' if len(relays) > 1 else ''} {', '.join(map(str, relays))}"
+            if not found.isdisjoint(_ON_WORDS):
+                await self.set_relays_batch({i: True for i in relays})
+                return f"{label} turned on."
+            elif not found.isdisjoint(_OFF_WORDS):
+                await self.set_relays_batch({i: False for i in relays})
+                return f"{label} turned off."
 
         # ---- Temperature ----
-        if any(w in command for w in ["temperature", "temp", "how hot", "how cold"]):
+        if not found.isdisjoint(_TEMPERATURE_WORDS):
             data = await self.get_sensors()
             temp = data.get("temperature", "unknown")
             hum = data.get("humidity", "unknown")
             return f"The temperature is {temp} degrees Celsius with {hum} percent humidity."
 
         # ---- Power ----
-        if any(w in command for w in ["voltage", "current", "power", "electricity"]):
+        if not found.isdisjoint(_POWER_WORDS):
             data = await self.get_power_data()
             v = data.get("voltage", "unknown")
             c = data.get("current", "unknown")
@@ -456,12 +562,12 @@ class HomeAutomationService:
                         return f"Scene {i} activated."
 
         # ---- Status ----
-        if any(w in command for w in ["status", "devices", "what's on"]):
+        if not found.isdisjoint(_STATUS_WORDS):
             status = await self.get_relay_status()
             return f"Device status: {json.dumps(status, indent=2)}"
 
         # ---- Buzzer ----
-        if any(w in command for w in ["alarm", "alert", "buzz", "beep"]):
+        if not found.isdisjoint(_BUZZER_WORDS):
             await self.buzz("alert")
             return "Alert buzzer activated."
 
@@ -8,7 +8,9 @@ import asyncio
 import time
 import json
 import os
+from collections import deque
 from enum import Enum
+from itertools import islice
 from datetime import datetime
 from typing import Optional, Dict, Callable, Any
 
@@ -44,8 +46,8 @@ class JarvisBrain:
         self._main_task: Optional[asyncio.Task] = None
 
         # Event log
-        self._event_log: list = []
         self._max_log = 500
+        self._event_log: deque = deque(maxlen=self._max_log)
 
         # Conversation context
         self._last_command = ""
@@ -348,9 +350,9 @@ class JarvisBrain:
             response = "I'm awake and ready!"
 
         elif any(w in command_lower for w in ["who am i", "identify me"]):
-            frame = camera_service.get_latest_frame()
+            frame, small = camera_service.get_frames()
             if frame is not None:
-                results = face_service.recognize_faces(frame)
+                results = await face_service.recognize_faces_async(frame, small)
                 if results:
                     names = [r.get("name", "Unknown") for r in results]
                     response = f"I see: {', '.join(names)}"
@@ -440,11 +442,12 @@ class JarvisBrain:
             "data": data,
         }
         self._event_log.append(entry)
-        if len(self._event_log) > self._max_log:
-            self._event_log = self._event_log[-self._max_log:]
 
     def get_event_log(self, limit: int = 50) -> list:
-        return self._event_log[-limit:]
+        # Walk back from the newest entry so the cost is O(limit)
+        tail = list(islice(reversed(self._event_log), limit))
+        tail.reverse()
+        return tail
 
     def on_state_change(self, callback):
         """Register a state-change callback."""
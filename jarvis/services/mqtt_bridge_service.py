@@ -17,6 +17,12 @@ try:
 except ImportError:
     mqtt_client = None
 
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
 logger = logging.getLogger("jarvis.mqtt_bridge")
 
 
@@ -74,15 +80,25 @@ class MQTTBridgeService:
     TOPIC_JARVIS_FACE_ID  = TOPIC_PREFIX + "jarvis/face/identified"
     TOPIC_JARVIS_PATROL   = TOPIC_PREFIX + "jarvis/patrol"
     TOPIC_AI_INFERENCE    = TOPIC_PREFIX + "ai/inference"
+    TOPIC_JARVIS_CAM_CMD  = TOPIC_PREFIX + "jarvis/camera/cmd"
+
+    # Topics whose payloads may be sent as MessagePack
+    COMMAND_TOPICS = frozenset({TOPIC_JARVIS_CMD, TOPIC_JARVIS_CAM_CMD})
+
+    MAX_INFLIGHT_MESSAGES = 20
 
     def __init__(self, broker: str = "127.0.0.1", port: int = 1883,
                  username: str = "", password: str = "",
-                 client_id: str = "jarvis-bridge"):
+                 client_id: str = "jarvis-bridge",
+                 msgpack_commands: bool = False):
         self.broker = broker
         self.port = port
         self.username = username
         self.password = password
         self.client_id = client_id
+        if msgpack_commands and not MSGPACK_AVAILABLE:
+            logger.warning("msgpack not installed, sending commands as JSON")
+        self.msgpack_commands = msgpack_commands and MSGPACK_AVAILABLE
 
         self.client: Optional[mqtt_client.Client] = None
         self.connected = False
@@ -90,6 +106,9 @@ class MQTTBridgeService:
         self._event_handlers: Dict[str, List[Callable]] = {}
         self._message_log: List[Dict] = []
         self._max_log_size = 500
+        # Commands waiting for the end of the current event-loop tick,
+        # keyed by target so only the last command per target is sent
+        self._pending: Dict[Any, tuple] = {}
 
         # Statistics
         self.stats = {
@@ -130,6 +149,11 @@ class MQTTBridgeService:
 
         try:
             self.client = mqtt_client.Client(client_id=self.client_id)
+            # paho's defaults, set explicitly so the pipelining the command
+            # path relies on is visible: 20 QoS>0 messages in flight
+            # before waiting on acks, 0 = unbounded outgoing queue
+            self.client.max_inflight_messages_set(self.MAX_INFLIGHT_MESSAGES)
+            self.client.max_queued_messages_set(0)
 
             if self.username:
                 self.client.username_pw_set(self.username, self.password)
@@ -382,7 +406,10 @@ class MQTTBridgeService:
 
         try:
             if isinstance(data, dict):
-                payload = json.dumps(data)
+                if self.msgpack_commands and topic in self.COMMAND_TOPICS:
+                    payload = msgpack.packb(data)
+                else:
+                    payload = json.dumps(data)
             elif isinstance(data, str):
                 payload = data
             else:
@@ -396,6 +423,35 @@ class MQTTBridgeService:
             self.stats["errors"] += 1
             return False
 
+    def _publish_latest(self, key: Any, topic: str, data: Dict, qos: int = 1) -> bool:
+        """Publish a command that supersedes earlier ones with the same key.
+
+        Called from the event loop, the write is deferred to the end of the
+        current tick so a burst of commands for one target (e.g. a relay
+        toggled repeatedly) goes out as a single publish of the last one.
+        The deferred write is fire-and-forget: True means the command was
+        queued, and a publish that then fails is logged by _drain_pending().
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self.publish(topic, data, qos=qos)
+
+        if not self.client or not self.connected:
+            logger.warning("Cannot publish: not connected")
+            return False
+
+        if not self._pending:
+            loop.call_soon(self._drain_pending)
+        self._pending[key] = (topic, data, qos)
+        return True
+
+    def _drain_pending(self):
+        pending, self._pending = self._pending, {}
+        for topic, data, qos in pending.values():
+            if not self.publish(topic, data, qos=qos):
+                logger.warning(f"Deferred publish to {topic} failed: {data}")
+
     def send_command(self, command: str, params: Dict = None) -> bool:
         """Send a command to the ESP32 server via MQTT."""
         data = {"command": command}
@@ -408,15 +464,23 @@ class MQTTBridgeService:
         data = {"command": command}
         if params:
             data.update(params)
-        return self.publish(self.TOPIC_PREFIX + "jarvis/camera/cmd", data)
+        return self.publish(self.TOPIC_JARVIS_CAM_CMD, data)
 
     # ---- Convenience Methods ----
+    # set_relay, set_lock, set_intruder_mode and set_flash coalesce through
+    # _publish_latest(): their True means "queued", not "published".
 
     def set_relay(self, relay_id: int, state: bool) -> bool:
-        return self.send_command("relay", {"relay": relay_id, "state": 1 if state else 0})
+        # QoS 0: fire-and-forget, a newer relay command supersedes a lost one
+        return self._publish_latest(
+            ("relay", relay_id), self.TOPIC_JARVIS_CMD,
+            {"command": "relay", "relay": relay_id, "state": 1 if state else 0},
+            qos=0)
 
     def set_lock(self, locked: bool) -> bool:
-        return self.send_command("lock" if locked else "unlock")
+        return self._publish_latest(
+            "lock", self.TOPIC_JARVIS_CMD,
+            {"command": "lock" if locked else "unlock"})
 
     def trigger_capture(self, context: str = "jarvis") -> bool:
         return self.send_camera_command("capture", {"context": context})
@@ -428,13 +492,17 @@ class MQTTBridgeService:
         return self.send_camera_command("patrol_stop")
 
     def set_intruder_mode(self, enabled: bool) -> bool:
-        return self.send_camera_command("intruder_mode", {"enabled": enabled})
+        return self._publish_latest(
+            "intruder_mode", self.TOPIC_JARVIS_CAM_CMD,
+            {"command": "intruder_mode", "enabled": enabled})
 
     def trigger_burst(self) -> bool:
         return self.send_camera_command("burst")
 
     def set_flash(self, intensity: int) -> bool:
-        return self.send_camera_command("flash", {"intensity": intensity})
+        return self._publish_latest(
+            "flash", self.TOPIC_JARVIS_CAM_CMD,
+            {"command": "flash", "intensity": intensity}, qos=0)
 
     def request_identify(self) -> bool:
         return self.send_camera_command("identify")
@@ -131,12 +131,12 @@ class RoomPresenceService:
 
     async def _check_presence(self):
         """Analyze current camera frame for presence."""
-        frame = camera_service.get_latest_frame()
+        frame, small = camera_service.get_frames()
         if frame is None:
             return
 
         # Detect and recognize faces
-        recognized = face_service.recognize_faces(frame)
+        recognized = await face_service.recognize_faces_async(frame, small)
         num_faces = len(recognized)
         now = time.time()
 
@@ -271,8 +271,8 @@ class RoomPresenceService:
         self._recording_intruder = True
         self._intruder_record_start = time.time()
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        video_path = os.path.join(settings.INTRUDER_DIR, f"intruder_{ts}.avi")
-        camera_service.start_recording(video_path)
+        video_path = camera_service.start_recording(
+            os.path.join(settings.INTRUDER_DIR, f"intruder_{ts}"))
         logger.info(f"Started intruder recording: {video_path}")
         return video_path
 
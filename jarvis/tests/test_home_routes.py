@@ -0,0 +1,36 @@
+"""
+Jarvis AI - Home Automation Route Tests
+"""
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient
+
+from jarvis import api
+
+
+@pytest.fixture
+def client(monkeypatch):
+    calls = []
+
+    async def set_relay(relay, state):
+        calls.append((relay, state))
+        return {"success": True}
+
+    monkeypatch.setattr(api.home_service, "set_relay", set_relay)
+    test_client = TestClient(api.app)
+    test_client.calls = calls
+    return test_client
+
+
+def test_relay_sets_valid_id(client):
+    response = client.post("/api/home/relay", params={"relay": 3, "state": "true"})
+    assert response.status_code == 200
+    assert client.calls == [(3, True)]
+
+
+@pytest.mark.parametrize("relay", [0, 9, "x"])
+def test_relay_rejects_bad_id(client, relay):
+    response = client.post("/api/home/relay", params={"relay": relay, "state": "true"})
+    assert response.status_code == 422
+    assert client.calls == []